@@ -1,45 +1,111 @@
+import gzip
 import os
 import sys
 import threading
+import time
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+MB = 1024 * 1024
 
-def upload_file_to_s3(s3_client, file_name, target_file_path=None, bucket_name="playcanvas-public"):
+# Small glbs go up in a single PUT, big rooms/walls are split into parts that upload in parallel
+TRANSFER_CONFIG = TransferConfig(
+     multipart_threshold=8 * MB,
+     multipart_chunksize=64 * MB,
+     max_concurrency=16,
+     use_threads=True
+)
+
+# Minimum seconds between progress bar redraws
+PROGRESS_INTERVAL = 0.1
+
+# One client is shared by all upload workers, each running TRANSFER_CONFIG.max_concurrency
+# transfer threads, so the keep-alive pool has to be much bigger than botocore's default of 10
+CLIENT_CONFIG = Config(
+     retries={'max_attempts': 5, 'mode': 'adaptive'},
+     s3={'addressing_style': 'virtual'},
+     tcp_keepalive=True,
+     max_pool_connections=64
+)
+
+
+def create_s3_client():
+     """
+     Create an S3 client with CLIENT_CONFIG
+     :return: Boto3 S3 client
+     """
+     return boto3.client('s3', config=CLIENT_CONFIG)
+
+
+def upload_file_to_s3(s3_client, file_name, target_file_path=None, bucket_name="playcanvas-public", content_type="model/gltf-binary", gzip_body=False):
      """
      Upload a file to an S3 bucket with improved progress tracking
      :param file_name: File to upload
      :param bucket_name: Bucket to upload to
      :param s3_client: Boto3 S3 client
      :param target_file_path: S3 object name. If not specified, file_name is used
+     :param content_type: Content-Type stored on the object
+     :param gzip_body: gzip the file and upload it with Content-Encoding: gzip
      :return: URL of the uploaded file if successful, else None
      """
 
      if target_file_path is None:
-          arget_file_path = os.path.basename(file_name)
+          target_file_path = os.path.basename(file_name)
+     assert target_file_path, f"No S3 key for {file_name}"
      
      class ProgressPercentage(object):
           def __init__(self, filename):
                self._filename = filename
                self._size = float(os.path.getsize(filename))
                self._seen_so_far = 0
+               self._last_percentage = -1
+               self._last_write = 0.0
                self._lock = threading.Lock()
 
           def __call__(self, bytes_amount):
-               # Update the progress bar
+               # Update the progress bar, only when we cross a whole percent and at most every
+               # PROGRESS_INTERVAL seconds so the transfer threads don't hammer stdout for every chunk
                with self._lock:
                     self._seen_so_far += bytes_amount
-                    percentage = (self._seen_so_far / self._size) * 100
+                    percentage = int((self._seen_so_far / self._size) * 100) if self._size else 100
+                    if percentage == self._last_percentage:
+                         return
+                    now = time.monotonic()
+                    if percentage < 100 and now - self._last_write < PROGRESS_INTERVAL:
+                         return
+                    self._last_percentage = percentage
+                    self._last_write = now
                     sys.stdout.write(
-                         "\rUploading %s  %.2f%%" % (
+                         "\rUploading %s  %d%%" % (
                               self._filename, percentage))
                     sys.stdout.flush()
 
      try:
-          s3_client.upload_file(
-               file_name, bucket_name, target_file_path,
-               Callback=ProgressPercentage(file_name)
-          )
+          if gzip_body:
+               # clients decompress transparently thanks to the Content-Encoding header
+               with open(file_name, "rb") as f:
+                    s3_client.put_object(
+                         Bucket=bucket_name, Key=target_file_path,
+                         Body=gzip.compress(f.read()), ContentType=content_type,
+                         ContentEncoding="gzip"
+                    )
+          elif os.path.getsize(file_name) < TRANSFER_CONFIG.multipart_threshold:
+               # Below the multipart threshold a single read + PUT is cheaper than
+               # upload_file's chunked read and callback pipeline
+               with open(file_name, "rb") as f:
+                    s3_client.put_object(
+                         Bucket=bucket_name, Key=target_file_path,
+                         Body=f.read(), ContentType=content_type
+                    )
+          else:
+               s3_client.upload_file(
+                    file_name, bucket_name, target_file_path,
+                    ExtraArgs={"ContentType": content_type},
+                    Callback=ProgressPercentage(file_name),
+                    Config=TRANSFER_CONFIG
+               )
      except ClientError as e:
           print(f"\nAn error occurred: {e}")
           return None
@@ -59,4 +125,20 @@ def check_if_s3_object_exists(s3_client, object_key, bucket_name="playcanvas-pub
           if e.response['Error']['Code'] == '404':
                return False
           else:
-               raise e
\ No newline at end of file
+               raise e
+
+
+def list_s3_keys(s3_client, prefix, bucket_name="playcanvas-public"):
+     """
+     List every key under a prefix, one request per 1000 keys instead of a HEAD per object
+     :param s3_client: Boto3 S3 client
+     :param prefix: Key prefix to scan
+     :param bucket_name: Bucket to scan
+     :return: set of keys
+     """
+     keys = set()
+     paginator = s3_client.get_paginator('list_objects_v2')
+     for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+          for item in page.get('Contents', []):
+               keys.add(item['Key'])
+     return keys
\ No newline at end of file
@@ -1,11 +1,17 @@
 import json
 import os
-import boto3
 import numpy as np
 import bpy
 import argparse
-from aws_utils import upload_file_to_s3, check_if_s3_object_exists
-from mathutils import Vector
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from aws_utils import create_s3_client, upload_file_to_s3, list_s3_keys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 def merge_children_to_parent(parent_object):
@@ -39,8 +45,7 @@ def merge_children_to_parent(parent_object):
         print("No child meshes found to merge.")
         return True
 
-    # Select all meshes and the parent
-    bpy.ops.object.select_all(action='DESELECT')  # Deselect all objects
+    # Select all meshes and the parent (callers keep nothing else selected)
     parent_object.select_set(True)  # Select parent object
     for child in meshes_to_merge:
         child.select_set(True)  # Select each child mesh
@@ -50,6 +55,8 @@ def merge_children_to_parent(parent_object):
 
     # Join the meshes into the parent
     bpy.ops.object.join()
+    # the children are gone after the join, deselect the result so nothing is left selected
+    parent_object.select_set(False)
     return True
     
     # Remove all original child objects safely
@@ -59,32 +66,52 @@ def merge_children_to_parent(parent_object):
     #        if child.name in bpy.data.objects:
     #            bpy.data.objects.remove(bpy.data.objects[child.name], do_unlink=True)
 
-def select_object_and_children(obj):
+# obj.children scans every object in the file on each access, so build a
+# parent name -> children lookup once and walk that instead
+def build_children_map():
+    children_map = {}
+    for o in bpy.data.objects:
+        parent_name = o.parent.name if o.parent is not None else None
+        children_map.setdefault(parent_name, []).append(o)
+    return children_map
+
+def iter_descendants(obj, children_map):
     """
-    Recursively select an object and all its children.
+    Breadth-first walk over all nested children of obj.
     """
-    obj.select_set(True)
-    for child in obj.children:
-        select_object_and_children(child)
+    queue = deque(children_map.get(obj.name, []))
+    while queue:
+        child = queue.popleft()
+        yield child
+        queue.extend(children_map.get(child.name, []))
 
-def get_selected_objects_center():
+def select_object_and_children(obj, children_map):
+    """
+    Select an object and all its nested children in one flat pass, returns the selected objects.
+    """
+    selected = []
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        o.select_set(True)
+        selected.append(o)
+        stack.extend(children_map.get(o.name, []))
+    return selected
+
+# Get the 8 bounding box corners of the object in world space as an (8, 3) array,
+# one matmul instead of a Matrix @ Vector per corner
+def get_world_bbox_corners(obj):
+    corners = np.array([tuple(corner) for corner in obj.bound_box], dtype=np.float64)
+    matrix_world = np.array(obj.matrix_world, dtype=np.float64)
+    return corners @ matrix_world[:3, :3].T + matrix_world[:3, 3]
+
+def get_selected_objects_center(obj):
     # get the object's geometric center in the world coordinates
-    # Get the world space bounds of the selected objects
-    bbox_min = np.array([float('inf')] * 3)
-    bbox_max = np.array([float('-inf')] * 3)
-    
     # Include the main object and all its children
-    for selected_obj in [obj] + list(obj.children):
-        # Get the object's bounding box corners in world space
-        bbox_corners = [selected_obj.matrix_world @ Vector(corner) for corner in selected_obj.bound_box]
-        
-        # Update min/max bounds
-        for corner in bbox_corners:
-            bbox_min = np.minimum(bbox_min, np.array(corner))
-            bbox_max = np.maximum(bbox_max, np.array(corner))
+    bbox_corners = np.concatenate([get_world_bbox_corners(o) for o in [obj] + list(obj.children)])
     
     # Calculate center of bounding box
-    center = (bbox_min + bbox_max) / 2
+    center = (bbox_corners.min(axis=0) + bbox_corners.max(axis=0)) / 2
     return center
 
 def sanitize_name(name):
@@ -98,33 +125,88 @@ def sanitize_name(name):
         name = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name)
     return name
 
-def find_object_by_name(name):
-    for obj in bpy.context.scene.objects:
-        if obj.name == name:
-            return obj
-    return None
+def find_object_by_name(name, name_map):
+    return name_map.get(name)
 
-def hide_object_and_children(obj):
+def hide_object_and_children(obj, children_map):
     obj.hide_set(True)
-    for child in obj.children:
-        hide_object_and_children(child)
+    for child in iter_descendants(obj, children_map):
+        child.hide_set(True)
 
 # ignore objects if any descendant has the name of "NeoProduct."
-def check_children_for_neoproduct(obj):
-    for child in obj.children:
-        if child.name.startswith("NeoProduct."):
-            return True
-        if check_children_for_neoproduct(child):
-            return True
-    return False
+def has_neoproduct_child(obj, children_map, neoproduct_cache):
+    return any(
+        child.name.startswith("NeoProduct.") or neoproduct_cache.get(child.name, False)
+        for child in children_map.get(obj.name, [])
+    )
+
+def get_leaves_first_order(children_map):
+    """
+    Every object in the hierarchy, ordered so children always come before their parents.
+    """
+    order = []
+    queue = deque(children_map.get(None, []))
+    while queue:
+        o = queue.popleft()
+        order.append(o)
+        queue.extend(children_map.get(o.name, []))
+    order.reverse()
+    return order
+
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+# One scene.json entry per line, written as soon as the entry is complete so a crash
+# doesn't lose everything exported so far
+def dump_json_line(data):
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+def load_json_lines(path):
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line) if orjson is not None else json.loads(line)
+            except ValueError:
+                # the last record of a crashed run can be cut off
+                continue
+
+
+# Draco quantizes and compresses the vertex/normal/uv arrays that make up most of a glb,
+# viewers need a Draco decoder to load these
+DRACO_EXPORT_SETTINGS = {
+    "export_draco_mesh_compression_enable": True,
+    "export_draco_mesh_compression_level": 6,
+    "export_draco_position_quantization": 14,
+    "export_draco_normal_quantization": 10,
+    "export_draco_texcoord_quantization": 12,
+}
 
 
 # Get the actual dimensions of the object in world space.
-def get_object_dimensions(obj):
-    bbox_corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
-    bbox_min = np.array([min(corner[i] for corner in bbox_corners) for i in range(3)])
-    bbox_max = np.array([max(corner[i] for corner in bbox_corners) for i in range(3)])
-    dimensions = bbox_max - bbox_min
+# Once transform_apply ran on an unparented object its matrix_world is the identity,
+# so bound_box is already in world space and we skip reading and applying the matrix
+def get_object_dimensions(obj, transform_applied=False):
+    if transform_applied and obj.parent is None:
+        bbox_corners = np.array([tuple(corner) for corner in obj.bound_box], dtype=np.float64)
+    else:
+        bbox_corners = get_world_bbox_corners(obj)
+    dimensions = bbox_corners.max(axis=0) - bbox_corners.min(axis=0)
     return dimensions.tolist()
     
 
@@ -137,6 +219,10 @@ if __name__ == "__main__":
                       help='Output directory (defaults to input file\'s parent directory)')
     parser.add_argument('--sanitize_name', action='store_true',
                       help='Enable name sanitization for objects')
+    parser.add_argument('--skip_existing_uploads', action='store_true',
+                      help='Skip uploading glbs that already exist in the bucket')
+    parser.add_argument('--glb_compression', choices=['none', 'draco', 'gzip'], default='none',
+                      help='Shrink uploaded glbs with Draco mesh compression or a gzip Content-Encoding')
 
     args = parser.parse_args()
 
@@ -151,16 +237,57 @@ if __name__ == "__main__":
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(os.path.join(output_dir, 'glbs'), exist_ok=True)
 
-    s3_client = boto3.client('s3')
-    scene_json = {"objects": {}}
+    # one client for everything, boto3 clients are thread safe and share a single
+    # keep-alive connection pool sized for the upload workers
+    s3_client = create_s3_client()
+    # uploads run in the background while blender exports the next object
+    executor = ThreadPoolExecutor(max_workers=8)
+    upload_futures = []
+
+    # finished entries are appended here (from the upload threads too) and turned into scene.json at the end.
+    # The file only goes away once scene.json is written, so a rerun after a crash skips what's already in it
+    scene_jsonl_path = os.path.join(output_dir, 'scene.jsonl')
+    finished_entries = {}
+    if os.path.exists(scene_jsonl_path):
+        finished_entries = {record["key"]: record["value"] for record in load_json_lines(scene_jsonl_path)}
+        print(f"Resuming, {len(finished_entries)} objects already exported")
+    scene_jsonl = open(scene_jsonl_path, "ab")
+    if scene_jsonl.tell() > 0:
+        # the previous run may have stopped in the middle of a line
+        scene_jsonl.write(b"\n")
+    scene_jsonl_lock = threading.Lock()
+    scene_keys = []
+
+    def write_scene_entry(key, entry):
+        with scene_jsonl_lock:
+            scene_jsonl.write(dump_json_line({"key": key, "value": entry}))
+            scene_jsonl.flush()
+
+    def write_scene_entry_after_upload(key, entry, future):
+        # a failed upload is raised when the futures are drained below
+        if future.exception() is not None:
+            return
+        entry["metadata"]["asset_url"] = future.result()
+        write_scene_entry(key, entry)
+
+    bucket_name = "playcanvas-public"
+    export_settings = DRACO_EXPORT_SETTINGS if args.glb_compression == "draco" else {}
+    gzip_uploads = args.glb_compression == "gzip"
+    # one paginated listing of this scene's keys instead of a HEAD request per glb
+    existing_keys = set()
+    if args.skip_existing_uploads:
+        existing_keys = list_s3_keys(s3_client, f"/spatio/{scene_id}-", bucket_name=bucket_name)
 
     # Load the blend file
     bpy.ops.wm.open_mainfile(filepath=args.input_blend_file)
 
+    name_map = {o.name: o for o in bpy.context.scene.objects}
+    children_map = build_children_map()
+
     # find the objects that have a prefix of "NeoProduct."
-    ceiling_group = find_object_by_name("ceilinggroup")
+    ceiling_group = find_object_by_name("ceilinggroup", name_map)
     # hide everything under the ceiling group, recursively
-    hide_object_and_children(ceiling_group) 
+    hide_object_and_children(ceiling_group, children_map) 
 
     # sanitize the names of all objects if enabled
     if args.sanitize_name:
@@ -171,63 +298,100 @@ if __name__ == "__main__":
                 print(f"Error sanitizing name: {e}")
                 continue
 
-    round_index = -1
-    while round_index < 10:
-        round_index += 1
-        target_objects = []
+    # Deselect everything once, after this nothing stays selected between steps:
+    # merges deselect their result and exports delete everything they selected
+    bpy.ops.object.select_all(action='DESELECT')
+
+    target_objects = []
+    children_map = build_children_map()
+    scene_object_names = {o.name for o in bpy.context.scene.objects}
+    neoproduct_cache = {}
+    leaves_first = get_leaves_first_order(children_map)
+    # NeoProducts that have NeoProducts below them before anything is unparented. The rounds used to join
+    # these into their wall/floor mesh instead of exporting them, so the ones under a wall or floor stay
+    had_neoproduct_child = {}
+    for obj in leaves_first:
+        had_neoproduct_child[obj.name] = has_neoproduct_child(obj, children_map, had_neoproduct_child)
+    merged_roots = set(o.name for o in children_map.get(bpy.data.objects["wallgroup"].name, []))
+    merged_roots.update(
+        o.name for o in children_map.get(bpy.data.objects["floorgroup"].name, []) if o.name.startswith("Room")
+    )
+    # Walk the hierarchy leaves first: by the time we reach an object, every NeoProduct below it
+    # has already been unparented, so one pass handles every nesting level (this used to take a round per level)
+    for obj in leaves_first:
         # ignore objects if any descendant has the name of "NeoProduct."
-        for obj in bpy.context.scene.objects:
-            if obj.name.startswith("NeoProduct."):
-                skip = False
-                parent = obj.parent
-                while parent is not None:
-                    if parent.name == "ceilinggroup":
-                        skip = True
-                        break
-                    parent = parent.parent
-                if skip:
-                    continue
-                if check_children_for_neoproduct(obj):
-                    continue
-                # Store the world location, rotation, and scale
-                world_matrix = obj.matrix_world.copy()
-                # Clear the parent while keeping the transform
-                obj.parent = None
-                # Restore the world transform
-                obj.matrix_world = world_matrix
-
-                # if merge_children_to_parent(obj):
-                target_objects.append(obj.name)
-
-        # now process the target objects and then remove them from the scene
-        for wall_obj in bpy.data.objects["wallgroup"].children:
-            # Deselect all objects first
-            bpy.ops.object.select_all(action='DESELECT')
+        neoproduct_cache[obj.name] = has_neoproduct_child(obj, children_map, neoproduct_cache)
+        if obj.name.startswith("NeoProduct.") and obj.name in scene_object_names:
+            skip = False
+            in_merged = obj.name in merged_roots
+            parent = obj.parent
+            while parent is not None:
+                if parent.name == "ceilinggroup":
+                    skip = True
+                    break
+                in_merged = in_merged or parent.name in merged_roots
+                parent = parent.parent
+            if skip:
+                continue
+            if neoproduct_cache[obj.name]:
+                continue
+            # joined into its wall/floor below, like the rounds did
+            if in_merged and had_neoproduct_child[obj.name]:
+                continue
+            # Store the world location, rotation, and scale
+            world_matrix = obj.matrix_world.copy()
+            # Clear the parent while keeping the transform, and keep the lookup in sync
+            if obj.parent is not None:
+                children_map[obj.parent.name].remove(obj)
+                children_map.setdefault(None, []).append(obj)
+            obj.parent = None
+            # Restore the world transform
+            obj.matrix_world = world_matrix
+
+            # if merge_children_to_parent(obj):
+            target_objects.append(obj.name)
+
+    # now process the target objects and then remove them from the scene
+    wall_children = children_map.get(bpy.data.objects["wallgroup"].name, [])
+    floor_children = children_map.get(bpy.data.objects["floorgroup"].name, [])
+    for wall_obj in wall_children:
+        # Set the active object
+        bpy.context.view_layer.objects.active = wall_obj
+        # join all the children into a single mesh
+        if merge_children_to_parent(wall_obj):
+            target_objects.append(wall_obj.name)
+
+    for floor_obj in floor_children:
+        if floor_obj.name.startswith("Room"):
             # Set the active object
-            bpy.context.view_layer.objects.active = wall_obj
+            bpy.context.view_layer.objects.active = floor_obj
             # join all the children into a single mesh
-            if merge_children_to_parent(wall_obj):
-                target_objects.append(wall_obj.name)
-
-        for floor_obj in bpy.data.objects["floorgroup"].children:
-            if floor_obj.name.startswith("Room"):
-                # Deselect all objects first
-                bpy.ops.object.select_all(action='DESELECT')
-                # Set the active object
-                bpy.context.view_layer.objects.active = floor_obj
-                # join all the children into a single mesh
-                if merge_children_to_parent(floor_obj):
-                    target_objects.append(floor_obj.name)
-
-        print(f"round {round_index}, {len(target_objects)} objects to process")
-        for obj_name in target_objects:
-            obj = bpy.data.objects[obj_name]
-            # Deselect all objects first
-            bpy.ops.object.select_all(action='DESELECT')
-            # Set the active object
-            bpy.context.view_layer.objects.active = obj
-            # Make sure the object is selected
-            obj.select_set(True)  
+            if merge_children_to_parent(floor_obj):
+                target_objects.append(floor_obj.name)
+
+    # joining removed the merged child meshes, so refresh the hierarchy
+    children_map = build_children_map()
+
+    print(f"{len(target_objects)} objects to process")
+    for obj_name in target_objects:
+        obj = bpy.data.objects[obj_name]
+
+        scene_key = f"{scene_id}-{obj.name}"
+        if scene_key in finished_entries:
+            # exported and uploaded by a previous run, only take it out of the scene like the others
+            scene_keys.append(scene_key)
+            for exported_obj in select_object_and_children(obj, children_map):
+                bpy.data.objects.remove(exported_obj, do_unlink=True)
+            continue
+
+        # Hand the operators an explicit context (active + selected = obj) so they don't
+        # need the view layer's active object and selection to be set up first
+        with bpy.context.temp_override(
+            active_object=obj,
+            object=obj,
+            selected_objects=[obj],
+            selected_editable_objects=[obj]
+        ):
             # Enter object mode to ensure we can modify the object
             bpy.ops.object.mode_set(mode='OBJECT')
             result = bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='BOUNDS')
@@ -242,66 +406,90 @@ if __name__ == "__main__":
             obj.matrix_world.translation = (0, 0, 0)
             # apply the transformation
             bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-            # Select the object and all nested children
-            # Export just this object and its children
-
-            select_object_and_children(obj)
-            glb_path = os.path.join(output_dir, 'glbs', f'neo_product_{obj.name}.glb')
-            bpy.ops.export_scene.gltf(
-                filepath=glb_path,
-                use_selection=True,
-            )
-            print(f"Exported {obj.name} to {glb_path}")
-
-            bucket_name = "playcanvas-public"
-            target_file_path = f"/spatio/{scene_id}-{obj.name}.glb"
-            asset_url = f"https://{bucket_name}.s3.amazonaws.com/{target_file_path}"
-            # if not check_if_s3_object_exists(s3_client, target_file_path, bucket_name=bucket_name):
-            #    print(f"{target_file_path} exists in {bucket_name}")
-            asset_url = upload_file_to_s3(s3_client, glb_path, target_file_path, bucket_name=bucket_name)
-
-            if obj.name.startswith("Wall"):
-                category = "walls"
-            elif obj.name.startswith("Room"):
-                category = "floors"
-            else:
-                category = "objects"
-            category = "objects"
 
-            dimensions = get_object_dimensions(obj)
-
-            scene_json["objects"][f"{scene_id}-{obj.name}"] = {
-                "category": category,
-                "placements": [
-                    {
-                        "position": [center.x, center.y, center.z],
-                        "rotation": [0, 0, 0],
-                        "scale": 1
-                    }
-                ],
-                "bbox_size": [
-                    1,
-                    1,
-                    1
-                ],
-                "dimensions": dimensions,
-                "identifier": f"{scene_id}-{obj.name}",
-                "metadata": {
-                    "asset_url": asset_url
+        # Select the object and all nested children
+        # Export just this object and its children
+        exported_objects = select_object_and_children(obj, children_map)
+        glb_path = os.path.join(output_dir, 'glbs', f'neo_product_{obj.name}.glb')
+        bpy.ops.export_scene.gltf(
+            filepath=glb_path,
+            use_selection=True,
+            **export_settings
+        )
+        print(f"Exported {obj.name} to {glb_path}")
+
+        if obj.name.startswith("Wall"):
+            category = "walls"
+        elif obj.name.startswith("Room"):
+            category = "floors"
+        else:
+            category = "objects"
+        category = "objects"
+
+        dimensions = get_object_dimensions(obj, transform_applied=True)
+
+        scene_keys.append(scene_key)
+        scene_entry = {
+            "category": category,
+            "placements": [
+                {
+                    "position": [center.x, center.y, center.z],
+                    "rotation": [0, 0, 0],
+                    "scale": 1
                 }
+            ],
+            "bbox_size": [
+                1,
+                1,
+                1
+            ],
+            "dimensions": dimensions,
+            "identifier": scene_key,
+            "metadata": {
+                "asset_url": None
             }
-            # save the scene_json to a file in the output directory
-            bpy.ops.object.delete()
-            bpy.context.view_layer.update()
-            # remove the selected objects from the scene
-            #print("deleting the object from the scene")
-            #bpy.ops.object.mode_set(mode='OBJECT')
-            #bpy.ops.object.delete()
+        }
+
+        target_file_path = f"/spatio/{scene_id}-{obj.name}.glb"
+        if target_file_path in existing_keys:
+            print(f"{target_file_path} exists in {bucket_name}")
+            scene_entry["metadata"]["asset_url"] = f"https://{bucket_name}.s3.amazonaws.com/{target_file_path}"
+            write_scene_entry(scene_key, scene_entry)
+        else:
+            # the entry is written once the upload finishes and we know its url
+            future = executor.submit(
+                upload_file_to_s3, s3_client, glb_path, target_file_path,
+                bucket_name=bucket_name, gzip_body=gzip_uploads
+            )
+            future.add_done_callback(
+                lambda f, key=scene_key, entry=scene_entry: write_scene_entry_after_upload(key, entry, f)
+            )
+            upload_futures.append(future)
+
+        # remove the exported objects from the scene, straight through bpy.data
+        # instead of bpy.ops.object.delete and its undo step
+        for exported_obj in exported_objects:
+            bpy.data.objects.remove(exported_obj, do_unlink=True)
+
+    # one depsgraph update at the end instead of one per deleted object, the operators
+    # above evaluate what they need themselves
+    bpy.context.view_layer.update()
+
+    # wait for the remaining uploads, their entries are written by the done callbacks
+    for future in upload_futures:
+        future.result()
+    # callbacks run on the worker threads, so after shutdown every entry is on disk
+    executor.shutdown()
+    scene_jsonl.close()
 
     # bpy.context.view_layer.update()
+    # assemble scene.json from the streamed entries (this run's and the resumed ones), in export order
+    entries = {record["key"]: record["value"] for record in load_json_lines(scene_jsonl_path)}
+    scene_json = {"objects": {key: entries[key] for key in scene_keys}}
     scene_json_path = os.path.join(output_dir, 'scene.json')
-    with open(scene_json_path, "w") as f:
-        json.dump(scene_json, f, indent=4)
+    save_json(scene_json, scene_json_path)
+    # scene.json is complete, nothing left to resume
+    os.remove(scene_jsonl_path)
 
     # save the debug blend file in the output directory
     debug_blend_path = os.path.join(output_dir, 'debug.blend')
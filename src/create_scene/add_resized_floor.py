@@ -32,82 +32,87 @@ import argparse
 import json
 import os
 import sys
-import math
-import copy
 
-def add_resized_floor(scene_json_path, blend_name, new_X, new_Y, new_scene_json_path):
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
 
-    with open(scene_json_path, 'r') as f:
-        scene_data = json.load(f)
+"""
+Scale the floors of an already loaded scene.json dict and return the new scene dict,
+main.py calls this directly so the scene is only parsed once for all create_scene stages
+"""
+def scale_floor(scene_data, blend_name, new_X, new_Y):
 
     objects_dict = scene_data.get("objects", {})
 
-    # 1) global pivot from ALL objects
-    gminx= math.inf
-    gmaxx= -math.inf
-    gminy= math.inf
-    gmaxy= -math.inf
+    # 1) one pass over ALL objects => (w, l, h, px, py, pz) rows + which ones are floors
+    prefix = blend_name + "-"
+    obj_keys = []
+    obj_details = []
+    rows = []
+    is_floor = []
 
-    for key, od in objects_dict.items():
+    for obj_key, od in objects_dict.items():
         dims= od.get("dimensions",[0,0,0])
         if len(dims)<2:
             continue
-        w, l= dims[0], dims[1]
         pls= od.get("placements",[])
         if not pls:
             continue
-        px, py= pls[0]["position"][0], pls[0]["position"][1]
-
-        x1= px
-        x2= px + w
-        y1= py
-        y2= py + l
-        if x1<gminx: gminx=x1
-        if x2>gmaxx: gmaxx=x2
-        if y1<gminy: gminy=y1
-        if y2>gmaxy: gmaxy=y2
-
-    pivot_x= 0.5*(gminx+gmaxx)
-    pivot_y= 0.5*(gminy+gmaxy)
-
-    # 2) find floors
-    prefix = blend_name + "-"
-    floor_objs = []
-    sum_w=0.0
-    sum_l=0.0
+        pos= pls[0]["position"]
 
-    for obj_key, od in objects_dict.items():
         # strip prefix
         if obj_key.startswith(prefix):
             stripped= obj_key[len(prefix):]
         else:
             stripped= obj_key
 
-        if "room" in stripped.lower():
-            dims= od.get("dimensions",[0,0,0])
-            if len(dims)<2:
-                continue
-            w, l= dims[0], dims[1]
-            h= dims[2] if len(dims)>=3 else 0.0
-            pls= od.get("placements",[])
-            if not pls:
-                continue
-            pos= pls[0]["position"]
-            px, py, pz = pos if len(pos)>=3 else (pos[0], pos[1], 0.0)
-
-            sum_w += w
-            sum_l += l
-
-            floor_objs.append({
-                "key": obj_key,
-                "details": od,
-                "orig_w": w,
-                "orig_l": l,
-                "orig_h": h,
-                "orig_px": px,
-                "orig_py": py,
-                "orig_pz": pz
-            })
+        obj_keys.append(obj_key)
+        obj_details.append(od)
+        rows.append((
+            dims[0], dims[1], dims[2] if len(dims)>=3 else 0.0,
+            pos[0], pos[1], pos[2] if len(pos)>=3 else 0.0
+        ))
+        is_floor.append("room" in stripped.lower())
+
+    data= np.array(rows, dtype=np.float64).reshape(-1, 6)
+    w, l, h, px, py, pz= data.T
+    floor_mask= np.array(is_floor, dtype=bool)
+
+    # global pivot from ALL objects
+    if len(data):
+        pivot_x= 0.5*(px.min() + (px + w).max())
+        pivot_y= 0.5*(py.min() + (py + l).max())
+    else:
+        pivot_x= 0.0
+        pivot_y= 0.0
+
+    # 2) floors => sum their widths and lengths
+    sum_w= float(w[floor_mask].sum())
+    sum_l= float(l[floor_mask].sum())
 
     # 3) scale factor from new_X vs sum_w
     scale_factor=1.0
@@ -117,30 +122,30 @@ def add_resized_floor(scene_json_path, blend_name, new_X, new_Y, new_scene_json_
     new_scene= {"objects": {}}
     new_objs= new_scene["objects"]
 
-    for fo in floor_objs:
-        k= fo["key"]
-        od= fo["details"]
-        w, l, h= fo["orig_w"], fo["orig_l"], fo["orig_h"]
-        px, py, pz= fo["orig_px"], fo["orig_py"], fo["orig_pz"]
-
-        sw= w*scale_factor
-        sl= l*scale_factor
-        sh= h*scale_factor
+    # 4) scale every floor at once
+    fw, fl, fh= w[floor_mask], l[floor_mask], h[floor_mask]
+    sw= fw*scale_factor
+    sl= fl*scale_factor
+    sh= fh*scale_factor
 
-        # if you want thickness offset
-        offset_z= sh - h
+    # if you want thickness offset
+    offset_z= sh - fh
 
-        dx= px- pivot_x
-        dy= py- pivot_y
-        new_px= pivot_x + dx* scale_factor
-        new_py= pivot_y + dy* scale_factor
+    new_px= pivot_x + (px[floor_mask] - pivot_x)* scale_factor
+    new_py= pivot_y + (py[floor_mask] - pivot_y)* scale_factor
 
-        # final pz= old pz - offset_z if you want the floor's top to remain the same
-        # or if you want no vertical shift, do final_pz= pz
-        temp_pz= pz - offset_z
+    # final pz= old pz - offset_z if you want the floor's top to remain the same
+    # or if you want no vertical shift, do final_pz= pz
+    # no shared offset
+    final_pz= pz[floor_mask] - offset_z
 
-        # no shared offset
-        final_pz= temp_pz
+    floor_idx= np.flatnonzero(floor_mask).tolist()
+    for i, sw_i, sl_i, sh_i, px_i, py_i, pz_i in zip(
+        floor_idx, sw.tolist(), sl.tolist(), sh.tolist(),
+        new_px.tolist(), new_py.tolist(), final_pz.tolist()
+    ):
+        k= obj_keys[i]
+        od= obj_details[i]
 
         new_key= k+"_scaled"
         c=1
@@ -148,32 +153,23 @@ def add_resized_floor(scene_json_path, blend_name, new_X, new_Y, new_scene_json_
             new_key= f"{k}_scaled_{c}"
             c+=1
 
-        new_obj= copy.deepcopy(od)
-        if "dimensions" not in new_obj or len(new_obj["dimensions"])<2:
-            new_obj["dimensions"]=[sw, sl, sh]
-        else:
-            new_obj["dimensions"][0]= sw
-            new_obj["dimensions"][1]= sl
-            if len(new_obj["dimensions"])>=3:
-                new_obj["dimensions"][2]= sh
-            else:
-                new_obj["dimensions"].append(sh)
-
-        if "placements" not in new_obj or not isinstance(new_obj["placements"], list):
-            new_obj["placements"]=[{
-                "position":[new_px,new_py,final_pz],
-                "rotation":[0,0,0],
-                "scale": scale_factor
-            }]
-        else:
-            new_obj["placements"][0]["position"]=[new_px,new_py,final_pz]
-            new_obj["placements"][0]["scale"]= scale_factor
-
-        new_obj["identifier"]= new_key
+        # every floor has >= 2 dims and a placement (checked in step 1), so shallow-copy
+        # the object and only rebuild the fields we change instead of deep copying it
+        pls= od["placements"]
+        new_obj= {
+            **od,
+            "dimensions": [sw_i, sl_i, sh_i] + list(od.get("dimensions", [])[3:]),
+            "placements": [{**pls[0], "position": [px_i,py_i,pz_i], "scale": scale_factor}] + list(pls[1:]),
+            "identifier": new_key
+        }
         new_objs[new_key]= new_obj
 
-    with open(new_scene_json_path,'w') as f:
-        json.dump(new_scene, f, indent=4)
+    return new_scene
+
+def add_resized_floor(scene_json_path, blend_name, new_X, new_Y, new_scene_json_path):
+    scene_data = load_json(scene_json_path)
+    new_scene = scale_floor(scene_data, blend_name, new_X, new_Y)
+    save_json(new_scene, new_scene_json_path)
 
 def main():
     parser= argparse.ArgumentParser()
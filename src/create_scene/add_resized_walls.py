@@ -9,6 +9,7 @@ INPUTS
  - wall_list: path to wall_list.json
  - new_scene: path to the new scene (new_scene.json)
  - scale_factor: scale factor in all dimensions
+ - scaled_floor_key: (optional) key of the scaled floor to anchor on
 
 
 APPROACH
@@ -31,58 +32,88 @@ import argparse
 import json
 import os
 import sys
-import math
-import copy
+import functools
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
 
 """
 MAIN HELPER
 
-1) Load original scene => to get old positions, rotations, etc.
-2) Load new_scene => already contains scaled floors.
+Works on already loaded dicts so main.py can pass them between stages, add_resized_walls is the file wrapper.
+
+1) Original scene => to get old positions, rotations, etc.
+2) new_scene => already contains scaled floors.
 3) For each group in wall_list:
     - Scale the main wall in XY from the global pivot
     - Shift/scale its final Pz relative to the new floor's Pz (fully relative)
     - Do the same for each "child" asset in that wall group
 """
-def add_resized_walls(original_scene, wall_list, new_scene, scale_factor):
+def scale_walls(orig_data, groups, new_scene_data, scale_factor, scaled_floor_key=None):
 
-    # 1) Load the original scene.
-    with open(original_scene, 'r') as f:
-        orig_data = json.load(f)
+    # 1) The original scene.
     orig_objs = orig_data.get("objects", {})
 
-    # 2) Load the new scene (with scaled floors)
-    with open(new_scene, 'r') as f:
-        new_scene_data = json.load(f)
-
+    # 2) The new scene (with scaled floors)
     if "objects" not in new_scene_data:
         new_scene_data["objects"] = {}
     new_objs = new_scene_data["objects"]
+    # next free suffix per emitted key base
+    suffix_counter = {}
 
     # 2a) Find *one* scaled floor, so we can anchor walls properly.
-    scaled_floor_key = None
+    # If the caller already knows the floor key, only that one is tried, otherwise we scan for it
     floor_final_pz = None
     old_floor_pz = None
 
-    for k, od in new_objs.items():
-        # e.g., floors often have "_scaled" and "room" in the name
-        if "_scaled" in k.lower() and "room" in k.lower():
-            placements = od.get("placements", [])
-            if not placements:
-                continue
-            final_pz = placements[0]["position"][2]
+    if scaled_floor_key is not None:
+        floor_candidates = [scaled_floor_key] if scaled_floor_key in new_objs else []
+    else:
+        # e.g., floors often have "_scaled" and "room" in the name, "_scaled" is checked first since it's cheap
+        floor_candidates = (k for k in new_objs if "_scaled" in k and "room" in k.lower())
 
-            # Figure out base key by removing "_scaled"… 
-            base_key = k.split("_scaled")[0]  # e.g. "dining_room-Room"
-            old_floor_obj = orig_objs.get(base_key)
-            if not old_floor_obj:
-                continue
+    for k in floor_candidates:
+        od = new_objs[k]
+        placements = od.get("placements", [])
+        if not placements:
+            continue
+        final_pz = placements[0]["position"][2]
 
-            old_pz = old_floor_obj["placements"][0]["position"][2]
-            scaled_floor_key = k
-            floor_final_pz = final_pz
-            old_floor_pz = old_pz
-            break
+        # Figure out base key by removing "_scaled"… 
+        base_key = k.split("_scaled")[0]  # e.g. "dining_room-Room"
+        old_floor_obj = orig_objs.get(base_key)
+        if not old_floor_obj:
+            continue
+
+        old_pz = old_floor_obj["placements"][0]["position"][2]
+        scaled_floor_key = k
+        floor_final_pz = final_pz
+        old_floor_pz = old_pz
+        break
 
     # Fallback if none found => keep original wall Pz unmodified
     if floor_final_pz is None or old_floor_pz is None:
@@ -92,41 +123,31 @@ def add_resized_walls(original_scene, wall_list, new_scene, scale_factor):
     else:
         anchor_with_floor = True
 
-    # 3) Load wall_list (groups of walls + assets) and compute global pivot from the original scene for XY scaling (same pivot used for floors)
-    gminx = math.inf
-    gmaxx = -math.inf
-    gminy = math.inf
-    gmaxy = -math.inf
-
-    for key, od in orig_objs.items():
-        dims = od.get("dimensions", [0,0,0])
-        if len(dims) < 2:
-            continue
-        w, l = dims[0], dims[1]
-        pls = od.get("placements", [])
-        if not pls:
-            continue
-        px, py = pls[0]["position"][0], pls[0]["position"][1]
-
-        x1, x2 = px, px + w
-        y1, y2 = py, py + l
-        if x1 < gminx: 
-            gminx = x1
-        if x2 > gmaxx: 
-            gmaxx = x2
-        if y1 < gminy: 
-            gminy = y1
-        if y2 > gmaxy: 
-            gmaxy = y2
-
-    pivot_x = 0.5 * (gminx + gmaxx)
-    pivot_y = 0.5 * (gminy + gmaxy)
+    # 3) Compute global pivot from the original scene for XY scaling (same pivot used for floors)
+    # (px, py, w, l) for every object with dims + a placement, reduced in one go
+    rows = [
+        (od["placements"][0]["position"][0], od["placements"][0]["position"][1], od["dimensions"][0], od["dimensions"][1])
+        for od in orig_objs.values()
+        if len(od.get("dimensions", [0,0,0])) >= 2 and od.get("placements")
+    ]
+    A = np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+    if len(A):
+        gminx, gminy = A[:, 0:2].min(axis=0)
+        gmaxx = (A[:, 0] + A[:, 2]).max()
+        gmaxy = (A[:, 1] + A[:, 3]).max()
+        pivot_x = float(0.5 * (gminx + gmaxx))
+        pivot_y = float(0.5 * (gminy + gmaxy))
+    else:
+        pivot_x = 0.0
+        pivot_y = 0.0
 
     """
     HELPER
     
-    retrieve original dims/pos/rot/etc
+    retrieve original dims/pos/rot/etc, parsed once per key since the same asset can sit in several wall groups
     """
+    @functools.lru_cache(maxsize=None)
     def get_orig_data(obj_key):
         od = orig_objs.get(obj_key)
         if not od:
@@ -159,117 +180,106 @@ def add_resized_walls(original_scene, wall_list, new_scene, scale_factor):
             "od": od
         }
 
-    """
-    HELPER
-
-    scale object in XY from the global pivot (Z is handled as a separate step)
-    """
-    def scale_in_xy(obj_key):
-        info = get_orig_data(obj_key)
-        if not info:
-            return None
-
-        sw = info["w"] * scale_factor
-        sl = info["l"] * scale_factor
-        sh = info["h"] * scale_factor
-
-        dx = info["px"] - pivot_x
-        dy = info["py"] - pivot_y
-        new_px = pivot_x + dx * scale_factor
-        new_py = pivot_y + dy * scale_factor
-
-        return {
-            "orig_key": obj_key,
-            "old_wall_pz": info["pz"],
-            "scaled_w": sw,
-            "scaled_l": sl,
-            "scaled_h": sh,
-            "temp_px": new_px,
-            "temp_py": new_py,
-            "temp_rot": info["rot"],
-            "temp_old_scale": info["orig_scale"],
-            "orig_objdict": info["od"]
-        }
-
-
     """
     HELPER
     
     insert new scaled object into the new scene
     """
-    def insert_obj(info, final_pz):
-        base_key = info["orig_key"]
-        new_key = base_key + "_scaled"
-        c = 1
+    def insert_obj(obj_key, info, scaled_dims, position):
+        base_key = obj_key
+        new_key_base = base_key + "_scaled"
+        c = suffix_counter.get(new_key_base, 0)
+        new_key = new_key_base if c == 0 else f"{new_key_base}_{c}"
+        # resume from the last suffix handed out, only keys that were already in the scene get probed
         while new_key in new_objs:
-            new_key = f"{base_key}_scaled_{c}"
             c += 1
+            new_key = f"{new_key_base}_{c}"
+        suffix_counter[new_key_base] = c + 1
 
-        new_obj = copy.deepcopy(info["orig_objdict"])
+        # shallow-copy the original and only rebuild the fields we change, the rest is shared
+        od = info["od"]
+        new_obj = dict(od)
 
         # Update dimensions
-        dims = new_obj.get("dimensions", [0,0,0])
-        if len(dims) < 2:
-            new_obj["dimensions"] = [info["scaled_w"], info["scaled_l"], info["scaled_h"]]
-        else:
-            new_obj["dimensions"][0] = info["scaled_w"]
-            new_obj["dimensions"][1] = info["scaled_l"]
-            if len(dims) >= 3:
-                new_obj["dimensions"][2] = info["scaled_h"]
-            else:
-                new_obj["dimensions"].append(info["scaled_h"])
+        dims = od.get("dimensions", [0,0,0])
+        new_obj["dimensions"] = scaled_dims + list(dims[3:])
 
         # Update placements
-        if "placements" not in new_obj or not isinstance(new_obj["placements"], list):
-            new_obj["placements"] = [{
-                "position": [info["temp_px"], info["temp_py"], final_pz],
-                "rotation": info["temp_rot"],
-                "scale": info["temp_old_scale"] * scale_factor
-            }]
+        new_placement = {
+            "position": position,
+            "rotation": list(info["rot"]),
+            "scale": info["orig_scale"] * scale_factor
+        }
+        pls = od.get("placements")
+        if not isinstance(pls, list):
+            new_obj["placements"] = [new_placement]
         else:
-            new_obj["placements"][0]["position"] = [info["temp_px"], info["temp_py"], final_pz]
-            new_obj["placements"][0]["rotation"] = info["temp_rot"]
-            old_local_s = info["temp_old_scale"]
-            new_obj["placements"][0]["scale"] = old_local_s * scale_factor
+            new_obj["placements"] = [{**pls[0], **new_placement}] + pls[1:]
 
         new_obj["identifier"] = new_key
         new_objs[new_key] = new_obj
 
-    # 4) For each wall group: scale main wall + child assets. Use fully relative offsets in Z, scaled by factor.
+    # 4) Collect every object to emit, in wall-group order: the main wall, then its child assets.
+    # wall_idx points each row at the row of its group's main wall (a wall points at itself)
+    emit = []
+    wall_idx = []
     for grp in groups:
         main_wall = grp.get("wall_asset")
         asset_list = grp.get("assets", [])
 
-        # Scale main wall in XY
-        winfo = scale_in_xy(main_wall)
+        winfo = get_orig_data(main_wall)
         if not winfo:
             continue
+        w_row = len(emit)
+        emit.append((main_wall, winfo))
+        wall_idx.append(w_row)
 
-        oldWallPz = winfo["old_wall_pz"]
-
-        if anchor_with_floor:
-            # FULLY RELATIVE offset from the scaled floor, scaled in Z
-            finalWallPz = floor_final_pz + (oldWallPz - old_floor_pz) * scale_factor
-        else:
-            # fallback => keep the old Pz
-            finalWallPz = oldWallPz
-
-        insert_obj(winfo, finalWallPz)
-
-        # Scale each asset => relative offset from the main wall, also scaled
         for ak in asset_list:
-            ainfo = scale_in_xy(ak)
+            ainfo = get_orig_data(ak)
             if not ainfo:
                 continue
-            oldAssetPz = ainfo["old_wall_pz"]
-
-            # For child => finalAssetPz = finalWallPz + scaled offset
-            finalAssetPz = finalWallPz + (oldAssetPz - oldWallPz) * scale_factor
-            insert_obj(ainfo, finalAssetPz)
+            emit.append((ak, ainfo))
+            wall_idx.append(w_row)
+
+    # 5) Scale all of them at once: P_new = (P - old_pivot) * s + new_pivot. XY pivots around the global pivot,
+    # Z is fully relative: walls from the scaled floor, child assets from their main wall, scaled by factor.
+    P = np.array([(info["px"], info["py"], info["pz"]) for _, info in emit], dtype=np.float64).reshape(-1, 3)
+    D = np.array([(info["w"], info["l"], info["h"]) for _, info in emit], dtype=np.float64).reshape(-1, 3)
+    wall_idx = np.array(wall_idx, dtype=np.intp)
+
+    pivot_xy = np.array([pivot_x, pivot_y])
+    P_new = np.empty_like(P)
+    P_new[:, :2] = (P[:, :2] - pivot_xy) * scale_factor + pivot_xy
+
+    oldWallPz = P[wall_idx, 2]
+    if anchor_with_floor:
+        # FULLY RELATIVE offset from the scaled floor, scaled in Z
+        finalWallPz = floor_final_pz + (oldWallPz - old_floor_pz) * scale_factor
+    else:
+        # fallback => keep the old Pz
+        finalWallPz = oldWallPz
+    # For child => finalAssetPz = finalWallPz + scaled offset (the offset is 0 for the wall itself)
+    P_new[:, 2] = finalWallPz + (P[:, 2] - oldWallPz) * scale_factor
+
+    D_new = D * scale_factor
+
+    # Only the writes back into new_objs stay in Python
+    for (obj_key, info), position, scaled_dims in zip(emit, P_new.tolist(), D_new.tolist()):
+        insert_obj(obj_key, info, scaled_dims, position)
+
+    return new_scene_data
+
+def add_resized_walls(original_scene, wall_list, new_scene, scale_factor, scaled_floor_key=None, indent=False):
+    new_scene_data = scale_walls(
+        orig_data=load_json(original_scene),
+        groups=load_json(wall_list),
+        new_scene_data=load_json(new_scene),
+        scale_factor=scale_factor,
+        scaled_floor_key=scaled_floor_key
+    )
 
     # 6) Update the new scene
-    with open(new_scene, 'w') as f:
-        json.dump(new_scene_data, f, indent=4)
+    save_json(new_scene_data, new_scene, indent=indent)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -277,13 +287,17 @@ def main():
     parser.add_argument("--wall_list", required=True)
     parser.add_argument("--new_scene", required=True)
     parser.add_argument("--scale_factor", required=True)
+    parser.add_argument("--scaled_floor_key", default=None, help="Key of the scaled floor to anchor on, searched for if not given")
+    parser.add_argument("--indent", action="store_true", help="Pretty-print the output scene")
     args = parser.parse_args()
 
     add_resized_walls(
         original_scene=args.original_scene,
         wall_list=args.wall_list,
         new_scene=args.new_scene,
-        scale_factor=float(args.scale_factor)
+        scale_factor=float(args.scale_factor),
+        scaled_floor_key=args.scaled_floor_key,
+        indent=args.indent
     )
 
 if __name__ == "__main__":
@@ -11,6 +11,7 @@ INPUTS:
  - new_scene: path to new_scene.json
  - scale_factor_x: scale factor x
  - scale_factor_y: scale factor y, technically doesn't matter right now
+ - scaled_floor_key: (optional) key of the scaled floor to anchor on
 
 OUTPUTS:
  - new_scene: The updated scene JSON file with the cloned asset groups placed. Each clone retains its original relative
@@ -38,41 +39,66 @@ import json
 import os
 import sys
 import math
-import copy
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
 
 
 """
 MAIN HELPER
 
-1) Load the original scene => get object positions and bounding boxes.
-2) Load the new scene => find scaled floor => read new floor dimensions (X, Y).
-3) Load asset_group_list => for each group with "Cloneable": true, do:
+Works on already loaded dicts so main.py can pass them between stages, place_cloneable_assets is the file wrapper.
+
+1) Original scene => get object positions and bounding boxes.
+2) New scene => find scaled floor => read new floor dimensions (X, Y).
+3) asset_group_list => for each group with "Cloneable": true, do:
     a) Compute bounding box of the group in original scene.
     b) Decide how many times to clone the group horizontally/vertically.
     c) Keep the group's internal spacing (do not stretch per-asset).
     d) Move each cloned group by an offset, thereby spacing groups out.
 """
-def place_cloneable_assets(
-    original_scene_path,
-    asset_group_list_path,
-    new_scene_path,
+def place_cloneables(
+    original_data,
+    asset_groups,
+    new_scene_data,
     scale_factor_x,
-    scale_factor_y
+    scale_factor_y,
+    scaled_floor_key=None
 ):
 
-    # 1) Load original scene
-    with open(original_scene_path, 'r') as f:
-        original_data = json.load(f)
-
+    # 1) Original scene
     orig_objs = original_data.get("objects", {})
 
-    # 2) Load the new scene (scaled floors)
-    with open(new_scene_path, 'r') as f:
-        new_scene_data = json.load(f)
-
+    # 2) The new scene (scaled floors)
     if "objects" not in new_scene_data:
         new_scene_data["objects"] = {}
     new_objs = new_scene_data["objects"]
+    # next free suffix per emitted key base
+    suffix_counter = {}
 
     # 2a) Locate the scaled floor to find new floor dimensions
     new_floor_width = None
@@ -81,41 +107,51 @@ def place_cloneable_assets(
     old_floor_pz = 0.0
     anchor_with_floor = False
 
-    for key, obj in new_objs.items():
-        key_lower = key.lower()
-        if ("floor" in key_lower or "room" in key_lower) and "_scaled" in key_lower:
-            dimensions = obj.get("dimensions", [0, 0, 0])
-            if len(dimensions) < 2:
-                continue
-            new_floor_width = float(dimensions[0])
-            new_floor_length = float(dimensions[1])
-
-            placements = obj.get("placements", [])
-            if placements and len(placements[0].get("position", [])) >= 3:
-                floor_final_pz = placements[0]["position"][2]
-                base_key = key.split("_scaled")[0]
-                old_floor_obj = orig_objs.get(base_key)
-                if old_floor_obj and "placements" in old_floor_obj:
-                    old_floor_pz = float(old_floor_obj["placements"][0]["position"][2])
-                    anchor_with_floor = True
-            break
+    # If the caller already knows the floor key use it, otherwise take the first scaled floor/room key
+    if scaled_floor_key is not None:
+        floor_candidates = [scaled_floor_key] if scaled_floor_key in new_objs else []
+    else:
+        # each key is lowered once
+        floor_candidates = (
+            key for key, key_lower in ((k, k.lower()) for k in new_objs)
+            if "_scaled" in key_lower and ("floor" in key_lower or "room" in key_lower)
+        )
+
+    for key in floor_candidates:
+        obj = new_objs[key]
+        dimensions = obj.get("dimensions", [0, 0, 0])
+        if len(dimensions) < 2:
+            continue
+        new_floor_width = float(dimensions[0])
+        new_floor_length = float(dimensions[1])
+
+        placements = obj.get("placements", [])
+        if placements and len(placements[0].get("position", [])) >= 3:
+            floor_final_pz = placements[0]["position"][2]
+            base_key = key.split("_scaled")[0]
+            old_floor_obj = orig_objs.get(base_key)
+            if old_floor_obj and "placements" in old_floor_obj:
+                old_floor_pz = float(old_floor_obj["placements"][0]["position"][2])
+                anchor_with_floor = True
+        break
 
     if new_floor_width is None or new_floor_length is None:
         new_floor_width = 10.0
         new_floor_length = 10.0
 
-    # 3) Load asset_group_list => filter cloneable groups
-    with open(asset_group_list_path, 'r') as f:
-        asset_groups = json.load(f)
-
+    # 3) asset_group_list => filter cloneable groups
     cloneable_groups = [group for group in asset_groups if group.get("Cloneable", False) is True]
 
     if not cloneable_groups:
         print("No cloneable groups found. No cloning performed.")
-        # Save the new scene as is
-        with open(new_scene_path, 'w') as f:
-            json.dump(new_scene_data, f, indent=4)
-        return
+        # The new scene as is
+        return new_scene_data
+
+    # Determine how many clones to tile in each axis, the same for every group
+    clones_x = max(1, int(math.floor(scale_factor_x)))
+    clones_y = max(1, int(math.floor(scale_factor_y)))
+    # (ix, iy) tile index grids, only the spacing they get multiplied by is per group
+    tile_ix, tile_iy = np.meshgrid(np.arange(clones_x), np.arange(clones_y), indexing='ij')
 
     # ---------------------------------------------------------------------
     #                               HELPERS
@@ -155,34 +191,48 @@ def place_cloneable_assets(
     """
     HELPER
 
-    Compute the bounding box of a group based on its assets.
+    Parse a group's assets once into parallel arrays (px, py, pz, w, l, h), next to the keys and records
+    they came from. Missing assets are dropped.
     """
-    def compute_group_bounds(asset_list):
-        
-        minx, miny = math.inf, math.inf
-        maxx, maxy = -math.inf, -math.inf
+    def parse_group(asset_list):
+        keys = []
+        records = []
         for asset_key in asset_list:
             data = get_obj_data(asset_key)
             if not data:
                 continue
-            x1 = data["px"]
-            y1 = data["py"]
-            x2 = x1 + data["w"]
-            y2 = y1 + data["l"]
-            minx = min(minx, x1)
-            miny = min(miny, y1)
-            maxx = max(maxx, x2)
-            maxy = max(maxy, y2)
-        if minx == math.inf or miny == math.inf:
+            keys.append(asset_key)
+            records.append(data)
+
+        cols = np.array(
+            [(d["px"], d["py"], d["pz"], d["w"], d["l"], d["h"]) for d in records], dtype=np.float64
+        ).reshape(-1, 6)
+        px, py, pz, w, l, h = cols.T
+        return {
+            "keys": keys,
+            "records": records,
+            "px": px, "py": py, "pz": pz,
+            "w": w, "l": l, "h": h
+        }
+
+    """
+    HELPER
+
+    Compute the bounding box of a group based on its parsed assets.
+    """
+    def compute_group_bounds(parsed):
+        
+        px, py = parsed["px"], parsed["py"]
+        if not len(px):
             return (0.0, 0.0, 0.0, 0.0)
-        return (minx, miny, maxx, maxy)
+        return (float(px.min()), float(py.min()), float((px + parsed["w"]).max()), float((py + parsed["l"]).max()))
 
     """
     HELPER
 
     Compute the centroid of a group's bounding box.
     """
-    def compute_group_centroid(bounds)
+    def compute_group_centroid(bounds):
         minx, miny, maxx, maxy = bounds
         centroid_x = (minx + maxx) / 2.0
         centroid_y = (miny + maxy) / 2.0
@@ -194,7 +244,7 @@ def place_cloneable_assets(
     Clone the entire group based on how many times we want to tile it.
     Keep the relative spacing of items within the group intact.
     """
-    def clone_group(grp, group_bounds, scale_factor_x, scale_factor_y):
+    def clone_group(parsed, group_bounds):
 
         minx, miny, maxx, maxy = group_bounds
         group_width = maxx - minx
@@ -205,10 +255,6 @@ def place_cloneable_assets(
 
         group_scale = 1.0
 
-        # Determine how many clones to tile in each axis
-        clones_x = max(1, int(math.floor(scale_factor_x)))
-        clones_y = max(1, int(math.floor(scale_factor_y)))
-
         # The bounding box of the scaled group
         scaled_group_width  = group_width  * group_scale
         scaled_group_length = group_length * group_scale
@@ -218,67 +264,79 @@ def place_cloneable_assets(
         spacing_x = scaled_group_width + gap_x
         spacing_y = scaled_group_length + gap_y
 
-        # For each tile, offset by (ix * spacing_x, iy * spacing_y)
+        if not parsed["keys"]:
+            return
+
+        # Each asset's position with the group scale applied around the centroid, shape (assets, 2)
+        pos = np.stack((parsed["px"], parsed["py"]), axis=-1)
+        centroid = np.array([centroid_x, centroid_y])
+        base_xy = centroid + (pos - centroid) * group_scale
+
+        # Z doesn't change between tiles
+        pz = parsed["pz"]
+        if anchor_with_floor:
+            final_pz = (floor_final_pz + (pz - old_floor_pz) * group_scale).tolist()
+        else:
+            final_pz = pz.tolist()
+
+        # For each tile, offset by (ix * spacing_x, iy * spacing_y) => (clones_x, clones_y, assets, 2)
+        offsets = np.stack((tile_ix * spacing_x, tile_iy * spacing_y), axis=-1)
+        # stays one float64 buffer, each tile's rows are only turned into Python floats when it's emitted
+        final_xy = base_xy[None, None, :, :] + offsets[:, :, None, :]
+
+        # One clone template per source asset, every tile only fills in its position and key
+        templates = [make_clone_template(data, group_scale) for data in parsed["records"]]
+
         for ix in range(clones_x):
             for iy in range(clones_y):
-                offset_x = ix * spacing_x
-                offset_y = iy * spacing_y
-
                 # Clone each asset in the group
-                for asset_key in grp.get("assets", []):
+                for asset_key, template, (final_x, final_y), asset_pz in zip(
+                    parsed["keys"], templates, final_xy[ix, iy].tolist(), final_pz
+                ):
                     clone_group_asset(
                         original_key=asset_key,
-                        group_centroid=(centroid_x, centroid_y),
-                        group_scale=group_scale,
-                        offset_x=offset_x,
-                        offset_y=offset_y,
+                        template=template,
+                        final_position=[final_x, final_y, asset_pz],
                         clone_indices=(ix, iy)
                     )
     """
     HELPER
 
-    Clone a single asset, preserving its relative offset from the group's centroid.
+    Build the parts of a cloned object that are the same for every tile: the object itself,
+    its first placement with the group scale applied to the local scale, and the other placements.
     """
-    def clone_group_asset(original_key, group_centroid, group_scale, offset_x, offset_y, clone_indices):
-        
-        ix, iy = clone_indices
-        data = get_obj_data(original_key)
-        if not data:
-            return
+    def make_clone_template(data, group_scale):
+        od = data["objdict"]
+        pls = od["placements"]
+        first_placement = {**pls[0], "scale": data["local_scale"] * group_scale}
+        return od, first_placement, pls[1:]
 
-        # Compute each asset’s local offset from group centroid
-        rel_x = data["px"] - group_centroid[0]
-        rel_y = data["py"] - group_centroid[1]
-
-        # Apply uniform scaling (if desired) to keep the group shape consistent
-        final_x = group_centroid[0] + rel_x * group_scale + offset_x
-        final_y = group_centroid[1] + rel_y * group_scale + offset_y
+    """
+    HELPER
 
-        # If we want to keep Z anchored to the floor, scale Z by group_scale as well
-        if anchor_with_floor:
-            final_pz = floor_final_pz + (data["pz"] - old_floor_pz) * group_scale
-        else:
-            final_pz = data["pz"]
+    Emit a single cloned asset at its precomputed position.
+    """
+    def clone_group_asset(original_key, template, final_position, clone_indices):
+        
+        ix, iy = clone_indices
 
         # Construct a unique key for the cloned asset
         new_key_base = f"{original_key}_clone_{ix}_{iy}"
-        new_key = new_key_base
-        counter = 1
+        counter = suffix_counter.get(new_key_base, 0)
+        new_key = new_key_base if counter == 0 else f"{new_key_base}_{counter}"
+        # resume from the last suffix handed out, only keys that were already in the scene get probed
         while new_key in new_objs:
-            new_key = f"{new_key_base}_{counter}"
             counter += 1
-
-        # Deep copy the original object
-        new_obj = copy.deepcopy(data["objdict"])
-
-        # Update positions
-        new_obj["placements"][0]["position"] = [final_x, final_y, final_pz]
-        # Apply uniform group scale to the local scale as well
-        new_obj["placements"][0]["scale"] = data["local_scale"] * group_scale
-
-        # Update identifier
-        new_obj["identifier"] = new_key
-        new_objs[new_key] = new_obj
+            new_key = f"{new_key_base}_{counter}"
+        suffix_counter[new_key_base] = counter + 1
+
+        # Shallow copy of the original object with the updated position and identifier
+        od, first_placement, other_placements = template
+        new_objs[new_key] = {
+            **od,
+            "placements": [{**first_placement, "position": final_position}] + other_placements,
+            "identifier": new_key
+        }
 
     # ---------------------------------------------------------------------
     #                               END HELPERS
@@ -294,8 +352,9 @@ def place_cloneable_assets(
         if not assets:
             continue
 
-        # Compute group bounds and centroid
-        group_bounds = compute_group_bounds(assets)
+        # Parse the group once, then compute group bounds and centroid
+        parsed = parse_group(assets)
+        group_bounds = compute_group_bounds(parsed)
         group_width = group_bounds[2] - group_bounds[0]
         group_length = group_bounds[3] - group_bounds[1]
 
@@ -304,15 +363,32 @@ def place_cloneable_assets(
 
         # Clone the group
         clone_group(
-            grp=group,
-            group_bounds=group_bounds,
-            scale_factor_x=scale_factor_x,
-            scale_factor_y=scale_factor_y
+            parsed=parsed,
+            group_bounds=group_bounds
         )
 
+    return new_scene_data
+
+def place_cloneable_assets(
+    original_scene_path,
+    asset_group_list_path,
+    new_scene_path,
+    scale_factor_x,
+    scale_factor_y,
+    scaled_floor_key=None,
+    indent=False
+):
+    new_scene_data = place_cloneables(
+        original_data=load_json(original_scene_path),
+        asset_groups=load_json(asset_group_list_path),
+        new_scene_data=load_json(new_scene_path),
+        scale_factor_x=scale_factor_x,
+        scale_factor_y=scale_factor_y,
+        scaled_floor_key=scaled_floor_key
+    )
+
     # 6) Save the updated new_scene
-    with open(new_scene_path, 'w') as f:
-        json.dump(new_scene_data, f, indent=4)
+    save_json(new_scene_data, new_scene_path, indent=indent)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -321,6 +397,8 @@ def main():
     parser.add_argument("--new_scene", required=True)
     parser.add_argument("--scale_factor_x", type=float, required=True)
     parser.add_argument("--scale_factor_y", type=float, required=True)
+    parser.add_argument("--scaled_floor_key", default=None, help="Key of the scaled floor to anchor on, searched for if not given")
+    parser.add_argument("--indent", action="store_true", help="Pretty-print the output scene")
     args = parser.parse_args()
 
     place_cloneable_assets(
@@ -328,7 +406,9 @@ def main():
         asset_group_list_path=args.asset_group_list,
         new_scene_path=args.new_scene,
         scale_factor_x=args.scale_factor_x,
-        scale_factor_y=args.scale_factor_y
+        scale_factor_y=args.scale_factor_y,
+        scaled_floor_key=args.scaled_floor_key,
+        indent=args.indent
     )
 
 if __name__ == "__main__":
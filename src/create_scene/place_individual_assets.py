@@ -31,186 +31,212 @@ import argparse
 import json
 import os
 import sys
-import math
-import copy
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# ijson lets the file wrapper stream the original objects instead of holding all of scene.json in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
 
 """
 MAIN HELPER
 
-1) Load original_scene => all objects (with original positions).
-2) Load new_scene => scaled floors/walls are in it. We'll append leftover 
+Works on already loaded dicts so main.py can pass them between stages, place_individual_assets is the file wrapper.
+
+1) original_scene => all objects (with original positions).
+2) new_scene => scaled floors/walls are in it. We'll append leftover 
     *non-cloneable* objects in that new scene.
-3) Load asset_group_list => skip groups that are Cloneable=True, only place groups 
+3) asset_group_list => skip groups that are Cloneable=True, only place groups 
     where Cloneable=False. For each group, for each asset => place it with pivot-based 
     XY shift, local scale=1.0, anchored in Z if possible.
 """
-def place_individual_assets(
-    original_scene_path,
-    asset_group_list_path,
-    new_scene_path,
+def place_individual(
+    original_data,
+    asset_groups,
+    new_scene_data,
     scale_factor
 ):
+    return place_individual_from_items(
+        original_data.get("objects", {}).items(), asset_groups, new_scene_data, scale_factor
+    )
 
-    # 1) Load original scene
-    with open(original_scene_path, 'r') as f:
-        original_data = json.load(f)
-
-    orig_objs = original_data.get("objects", {})
-
-    # 2) Load new scene
-    with open(new_scene_path, 'r') as f:
-        new_scene_data = json.load(f)
+"""
+Same as place_individual, but the original objects come as an iterable of (key, object) pairs that is
+read exactly once, so the file wrapper can stream them out of scene.json. Only the objects we actually
+place (and the old floor) are kept around, everything else only contributes to the global pivot.
+"""
+def place_individual_from_items(
+    orig_items,
+    asset_groups,
+    new_scene_data,
+    scale_factor
+):
 
+    # 1) New scene
     if "objects" not in new_scene_data:
         new_scene_data["objects"] = {}
     new_objs = new_scene_data["objects"]
-
-    # 2a) Identify a scaled floor for anchoring Pz offset
-    scaled_floor_key = None
-    floor_final_pz = 0.0
-    old_floor_pz = 0.0
-    anchor_with_floor = False
-
-    for k, od in new_objs.items():
+    # next free suffix per emitted key base
+    suffix_counter = {}
+
+    # 2) Scaled floor candidates, their original (unscaled) floor is looked up further down
+    floor_candidates = []
+    # Only keys with "_scaled" can be a scaled floor (split below needs it verbatim anyway),
+    # the cheap substring test skips everything else before any lowercasing
+    scaled_keys = [k for k in new_objs if "_scaled" in k]
+    for k in scaled_keys:
+        od = new_objs[k]
         # We look for a floor/room key that has "_scaled"
         # Adapt if your naming differs
-        if ("floor" in k.lower() or "room" in k.lower()) and "_scaled" in k.lower():
+        lk = k.lower()
+        if ("floor" in lk or "room" in lk) and "_scaled" in lk:
             pls = od.get("placements", [])
             if not pls:
                 continue
-            final_pz = pls[0]["position"][2]
-            base_key = k.split("_scaled")[0]
-
-            old_floor_obj = orig_objs.get(base_key)
-            if not old_floor_obj:
-                continue
-            old_pz = old_floor_obj["placements"][0]["position"][2]
-
-            scaled_floor_key = k
-            floor_final_pz = final_pz
-            old_floor_pz = old_pz
-            anchor_with_floor = True
-
-            break
+            floor_candidates.append((k, pls[0]["position"][2], k.split("_scaled")[0]))
+    floor_base_keys = {base_key for _, _, base_key in floor_candidates}
 
-    # 3) Load asset_group_list
-    with open(asset_group_list_path, 'r') as f:
-        asset_groups = json.load(f)
-
-    gminx = math.inf
-    gmaxx = -math.inf
-    gminy = math.inf
-    gmaxy = -math.inf
-
-    for key, od in orig_objs.items():
+    # Every asset of the non-cloneable groups
+    leftover_keys = set()
+    for grp in asset_groups:
+        if isinstance(grp, dict) and grp.get("Cloneable", True) is not True:
+            leftover_keys.update(grp.get("assets", []))
+
+    # 3) One pass over the original scene: cache the leftover objects as
+    # (od, px, py, pz, rot, w, l, h, orig_scale), keep the candidate old floors,
+    # and collect the (px, py, w, l) rows of every usable object for the global pivot
+    orig_cache = {}
+    orig_floors = {}
+    skipped = {}
+    rows = []
+    # scale_factor 1.0 leaves XY where it is, so the pivot (and its rows) isn't needed at all
+    identity = scale_factor == 1.0
+    for key, od in orig_items:
+        if key in floor_base_keys:
+            orig_floors[key] = od
+        if not od:
+            continue
         dims = od.get("dimensions", [0,0,0])
         if len(dims) < 2:
+            skipped[key] = "missing dims"
             continue
-        w, l = dims[0], dims[1]
         pls = od.get("placements", [])
         if not pls:
+            skipped[key] = "has no placements"
+            continue
+        px, py, pz = (list(pls[0].get("position", [0,0,0])) + [0.0, 0.0, 0.0])[:3]
+        if not identity:
+            rows.append((px, py, dims[0], dims[1]))
+        if key in leftover_keys:
+            orig_cache[key] = (
+                od, px, py, pz,
+                pls[0].get("rotation", [0,0,0]),
+                dims[0], dims[1], (dims[2] if len(dims) >= 3 else 0.0),
+                pls[0].get("scale", 1.0)
+            )
+
+    # 2a) Identify a scaled floor for anchoring Pz offset
+    scaled_floor_key = None
+    floor_final_pz = 0.0
+    old_floor_pz = 0.0
+    anchor_with_floor = False
+
+    for k, final_pz, base_key in floor_candidates:
+        old_floor_obj = orig_floors.get(base_key)
+        if not old_floor_obj:
             continue
-        px, py = pls[0]["position"][0], pls[0]["position"][1]
+        old_pz = old_floor_obj["placements"][0]["position"][2]
 
-        x1, x2 = px, px + w
-        y1, y2 = py, py + l
+        scaled_floor_key = k
+        floor_final_pz = final_pz
+        old_floor_pz = old_pz
+        anchor_with_floor = True
 
-        if x1 < gminx: gminx = x1
-        if x2 > gmaxx: gmaxx = x2
-        if y1 < gminy: gminy = y1
-        if y2 > gmaxy: gmaxy = y2
+        break
 
-    pivot_x = 0.5 * (gminx + gmaxx)
-    pivot_y = 0.5 * (gminy + gmaxy)
+    # (px, py, w, l) rows reduced in one go
+    A = np.array(rows, dtype=np.float64).reshape(-1, 4)
+
+    if len(A) and not identity:
+        gminx, gminy = A[:, 0:2].min(axis=0)
+        gmaxx, gmaxy = (A[:, 0:2] + A[:, 2:4]).max(axis=0)
+        pivot_x = float(0.5 * (gminx + gmaxx))
+        pivot_y = float(0.5 * (gminy + gmaxy))
+    else:
+        pivot_x = 0.0
+        pivot_y = 0.0
 
 # ---------------------------------------------------------------------
 #                               HELPERS
 # ---------------------------------------------------------------------
 
     def get_orig_data(obj_key):
-        od = orig_objs.get(obj_key)
-        if not od:
-            print(f" [WARN] leftover '{obj_key}' not in original scene.")
-            return None
-        dims = od.get("dimensions", [0,0,0])
-        if len(dims) < 2:
-            print(f" [WARN] leftover '{obj_key}' missing dims.")
-            return None
-        w, l = dims[0], dims[1]
-        h = dims[2] if len(dims) >= 3 else 0.0
-
-        pls = od.get("placements", [])
-        if not pls:
-            print(f" [WARN] leftover '{obj_key}' has no placements.")
-            return None
-        pos = pls[0].get("position", [0,0,0])
-        while len(pos) < 3:
-            pos.append(0.0)
-
-        px, py, pz = pos[0], pos[1], pos[2]
-        rot = pls[0].get("rotation", [0,0,0])
-        old_local_scale = pls[0].get("scale", 1.0)
-
-        return {
-            "od": od,
-            "px": px, "py": py, "pz": pz,
-            "rot": rot,
-            "w": w, "l": l, "h": h,
-            "orig_scale": old_local_scale
-        }
-
-    def transform_xy(obj_key):
-        info = get_orig_data(obj_key)
-        if not info:
-            return None
-
-        dx = info["px"] - pivot_x
-        dy = info["py"] - pivot_y
-        new_px = pivot_x + dx*scale_factor
-        new_py = pivot_y + dy*scale_factor
-
-        return {
-            "orig_key": obj_key,
-            "orig_obj": info["od"],
-            "dims": [info["w"], info["l"], info["h"]],
-            "old_local_scale": info["orig_scale"],
-            "old_pz": info["pz"],
-            "temp_px": new_px,
-            "temp_py": new_py,
-            "temp_rot": info["rot"]
-        }
+        entry = orig_cache.get(obj_key)
+        if entry is not None:
+            return entry
 
-    def insert_obj(tinfo):
-        base_key = tinfo["orig_key"]
-        new_key = base_key + "_placed"
-        c = 1
+        if obj_key in skipped:
+            print(f" [WARN] leftover '{obj_key}' {skipped[obj_key]}.")
+        else:
+            print(f" [WARN] leftover '{obj_key}' not in original scene.")
+        return None
+
+    def insert_obj(obj_key, entry, new_px, new_py, final_pz):
+        base_key = obj_key
+        od, px, py, pz, rot, w, l, h, orig_scale = entry
+        new_key_base = base_key + "_placed"
+        c = suffix_counter.get(new_key_base, 0)
+        new_key = new_key_base if c == 0 else f"{new_key_base}_{c}"
+        # resume from the last suffix handed out, only keys that were already in the scene get probed
         while new_key in new_objs:
-            new_key = f"{base_key}_placed_{c}"
             c += 1
+            new_key = f"{new_key_base}_{c}"
+        suffix_counter[new_key_base] = c + 1
 
-        new_od = copy.deepcopy(tinfo["orig_obj"])
+        # shallow copy, only dimensions, the first placement and the identifier are rebuilt
+        new_od = dict(od)
 
         # Keep original dims
-        new_od["dimensions"] = tinfo["dims"]
-
-        # final pz
-        if anchor_with_floor:
-            # e.g. fully relative in Z
-            final_pz = floor_final_pz + (tinfo["old_pz"] - old_floor_pz)*scale_factor
-        else:
-            final_pz = tinfo["old_pz"]
+        new_od["dimensions"] = [w, l, h]
 
-        pls = new_od.get("placements", [])
+        new_placement = {
+            "position": [new_px, new_py, final_pz],
+            "rotation": list(rot),
+            "scale": 1.0
+        }
+        pls = od.get("placements", [])
         if not pls or not isinstance(pls, list):
-            new_od["placements"] = [{
-                "position": [tinfo["temp_px"], tinfo["temp_py"], final_pz],
-                "rotation": tinfo["temp_rot"],
-                "scale": 1.0
-            }]
+            new_od["placements"] = [new_placement]
         else:
-            new_od["placements"][0]["position"] = [tinfo["temp_px"], tinfo["temp_py"], final_pz]
-            new_od["placements"][0]["rotation"] = tinfo["temp_rot"]
-            new_od["placements"][0]["scale"] = 1.0
+            new_od["placements"] = [{**pls[0], **new_placement}] + pls[1:]
 
         new_od["identifier"] = new_key
         new_objs[new_key] = new_od
@@ -220,6 +246,9 @@ def place_individual_assets(
     #                               END HELPERS
     # ---------------------------------------------------------------------
 
+    # Every asset of the non-cloneable groups, in order. Missing ones stay in the list as None,
+    # so their warning still prints in the same place
+    leftovers = []
     for grp in asset_groups:
         if not isinstance(grp, dict):
             continue
@@ -232,13 +261,58 @@ def place_individual_assets(
         assets_list = grp.get("assets", [])
 
         for ak in assets_list:
-            tinfo = transform_xy(ak)
-            if tinfo:
-                insert_obj(tinfo)
+            leftovers.append((ak, orig_cache.get(ak)))
+
+    # Transform all leftover positions at once: pivot-based XY shift, and Z fully relative to the floor if we have one
+    found = [entry for _, entry in leftovers if entry is not None]
+    xyz = np.array([(e[1], e[2], e[3]) for e in found], dtype=np.float64).reshape(-1, 3)
+    if identity:
+        new_xy = xyz[:, :2]
+    else:
+        pivot_xy = np.array([pivot_x, pivot_y])
+        new_xy = pivot_xy + (xyz[:, :2] - pivot_xy) * scale_factor
+    if anchor_with_floor and identity:
+        new_pz = floor_final_pz + (xyz[:, 2] - old_floor_pz)
+    elif anchor_with_floor:
+        new_pz = floor_final_pz + (xyz[:, 2] - old_floor_pz) * scale_factor
+    else:
+        new_pz = xyz[:, 2]
+    new_positions = iter(zip(new_xy.tolist(), new_pz.tolist()))
+
+    for ak, entry in leftovers:
+        if entry is None:
+            get_orig_data(ak)
+            continue
+        (new_px, new_py), final_pz = next(new_positions)
+        insert_obj(ak, entry, new_px, new_py, final_pz)
+
+    return new_scene_data
+
+def place_individual_assets(
+    original_scene_path,
+    asset_group_list_path,
+    new_scene_path,
+    scale_factor,
+    indent=False
+):
+
+    # 1) Load new scene
+    new_scene_data = load_json(new_scene_path)
+
+    # 2) Load asset_group_list
+    asset_groups = load_json(asset_group_list_path)
+
+    # 3) Stream the original scene's objects if we can, otherwise load it whole
+    if ijson is not None:
+        with open(original_scene_path, 'rb') as f:
+            new_scene_data = place_individual_from_items(
+                ijson.kvitems(f, 'objects', use_float=True), asset_groups, new_scene_data, scale_factor
+            )
+    else:
+        new_scene_data = place_individual(load_json(original_scene_path), asset_groups, new_scene_data, scale_factor)
 
     # 5) Write updated new_scene
-    with open(new_scene_path, 'w') as f:
-        json.dump(new_scene_data, f, indent=4)
+    save_json(new_scene_data, new_scene_path, indent=indent)
 
 # ---------------------------------------------------------------------
 #                               MAIN
@@ -250,13 +324,15 @@ def main():
     parser.add_argument("--asset_group_list", required=True)
     parser.add_argument("--new_scene", required=True)
     parser.add_argument("--scale_factor", required=True, type=float)
+    parser.add_argument("--indent", action="store_true", help="Pretty-print the output scene")
     args = parser.parse_args()
 
     place_individual_assets(
         original_scene_path=args.original_scene,
         asset_group_list_path=args.asset_group_list,
         new_scene_path=args.new_scene,
-        scale_factor=args.scale_factor
+        scale_factor=args.scale_factor,
+        indent=args.indent
     )
 
 if __name__ == "__main__":
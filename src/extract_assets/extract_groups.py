@@ -29,21 +29,71 @@ APPROACH
     b. User messages containing chunks (up to 9 per message) of scene images, each encoded as a data URL
     c. A final user message that includes the JSON of leftover objects and the user-provided prompt
  4. Call the GPT-4(vision) model using the assembled messages
+    - With more than 2 messages worth of images, send one request per image chunk concurrently and merge
+      the returned groups (each asset is kept in the first group that claims it, ids are renumbered)
  5. Parse and validate the JSON response
     - Ensure that the response is a list of dictionaries with the required keys ("id", "group_name", "assets", "Cloneable")
  6. Write the validated groups to the output JSON file (asset_group_list.json)
 """
 
 import argparse
+import asyncio
 import json
 import os
 import sys
 import base64
+import hashlib
+import io
 import logging
-import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
 
+# pybase64 is a SIMD base64 with the same API, use it for the image payloads when it's installed
+try:
+    import pybase64 as b64lib
+except ImportError:
+    b64lib = base64
+
+# Pillow is only needed to shrink the images before upload, without it the original bytes are sent
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# indented JSON as a str, numpy values are serialized too when orjson is available
+def dumps_json(data):
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode("utf-8")
+    return json.dumps(data, indent=2)
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
 # 1) TRY IMPORTS FOR OpenAIError
 OpenAIError = None
 try:
@@ -72,6 +122,19 @@ logging.basicConfig(
 # Maximum number of images per user message
 MAX_IMAGES_PER_MESSAGE = 9
 
+# Threads used to read + encode the scene images
+IMAGE_ENCODE_WORKERS = 8
+
+# Default directory for the cached base64 of each image, next to the output json (not in the image directory)
+B64_CACHE_DIR = os.path.join(".cache", "b64")
+
+# detail="low" images are resized to 512x512 by the model anyway, so never send anything bigger
+LOW_DETAIL_MAX_SIDE = 512
+LOW_DETAIL_JPEG_QUALITY = 80
+
+# Decoder for the model's response, see parse_model_json
+JSON_DECODER = json.JSONDecoder()
+
 # ---------------------------------------------------------------------
 #                               HELPERS
 # ---------------------------------------------------------------------
@@ -79,19 +142,79 @@ MAX_IMAGES_PER_MESSAGE = 9
 """
 HELPER
 
-Reads file at `path`, Base64-encodes it, and returns a dict
-suitable for the Chat Completions message content with
-type="image_url"
+Bytes to upload for the image at `path`. With `max_side` (and Pillow installed) the image is
+shrunk so its longest side is at most `max_side` and re-encoded as JPEG, otherwise the file is
+sent unchanged. Returns (bytes, mime).
 """
-def encode_image_as_data_url(path: str, detail: str = "auto") -> dict:
+def read_image_bytes(path: str, max_side: int = None):
+    if max_side is not None and Image is not None:
+        with Image.open(path) as img:
+            img.thumbnail((max_side, max_side))
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, "JPEG", quality=LOW_DETAIL_JPEG_QUALITY)
+        return buf.getvalue(), "image/jpeg"
+
     with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
+        data = f.read()
     # Determine MIME type based on file extension
     ext = os.path.splitext(path)[1].lower()
     if ext == ".png":
         mime = "image/png"
     else:
         mime = "image/jpeg"
+    return data, mime
+
+"""
+HELPER
+
+(base64, mime) of the image at `path` as returned by read_image_bytes, cached on disk in `cache_dir`
+(no caching if it's None). The cache key is the path + mtime + size (+ the resize) so an image that changed is
+re-encoded, unchanged ones are never re-read.
+"""
+def read_image_b64(path: str, max_side: int = None, cache_dir: str = None):
+    if Image is None:
+        max_side = None
+    if cache_dir is None:
+        data, mime = read_image_bytes(path, max_side)
+        return b64lib.b64encode(data).decode("ascii"), mime
+
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}:{max_side}"
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    cache_path = os.path.join(cache_dir, digest + ".txt")
+
+    # first line is the mime, the rest is the base64
+    try:
+        with open(cache_path, "r") as f:
+            mime, b64 = f.read().split("\n", 1)
+            return b64, mime
+    except (OSError, ValueError):
+        pass
+
+    data, mime = read_image_bytes(path, max_side)
+    b64 = b64lib.b64encode(data).decode("ascii")
+
+    # write to a temp file + rename, several encoder threads can be filling the cache at once
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", dir=cache_dir, suffix=".tmp", delete=False) as tmp:
+            tmp.write(mime + "\n" + b64)
+        os.replace(tmp.name, cache_path)
+    except OSError as e:
+        logging.warning(f"Could not cache base64 for {path}: {e}")
+    return b64, mime
+
+"""
+HELPER
+
+Reads file at `path`, Base64-encodes it, and returns a dict
+suitable for the Chat Completions message content with
+type="image_url". detail="low" images are downscaled to
+LOW_DETAIL_MAX_SIDE first. `cache_dir` is passed on to read_image_b64
+"""
+def encode_image_as_data_url(path: str, detail: str = "auto", cache_dir: str = None) -> dict:
+    max_side = LOW_DETAIL_MAX_SIDE if detail == "low" else None
+    b64, mime = read_image_b64(path, max_side, cache_dir)
     return {
         "type": "image_url",
         "image_url": {
@@ -135,7 +258,7 @@ Build the messages for a single Chat Completions request:
     2) user messages with scene images (in chunks)
     3) final user message with leftover_assets + user_prompt
 """
-def build_prompt_messages(scene_paths, leftover_assets, user_prompt):
+def build_prompt_messages(scene_paths, leftover_assets, user_prompt, cache_dir=None):
     
     messages = []
 
@@ -168,12 +291,12 @@ def build_prompt_messages(scene_paths, leftover_assets, user_prompt):
     })
 
     # 2) Add scene images (in chunks)
-    for chunk in chunk_list(scene_paths, MAX_IMAGES_PER_MESSAGE):
-        content_chunk = []
-        for spath in chunk:
-            encoded = encode_image_as_data_url(spath, detail="low")
-            if encoded:
-                content_chunk.append(encoded)
+    # reading + base64 of the images is independent per file, so do them all at once on a thread pool
+    with ThreadPoolExecutor(max_workers=IMAGE_ENCODE_WORKERS) as executor:
+        encoded_all = list(executor.map(lambda spath: encode_image_as_data_url(spath, detail="low", cache_dir=cache_dir), scene_paths))
+
+    for chunk in chunk_list(encoded_all, MAX_IMAGES_PER_MESSAGE):
+        content_chunk = [encoded for encoded in chunk if encoded]
         if content_chunk:
             messages.append({
                 "role": "user",
@@ -183,7 +306,7 @@ def build_prompt_messages(scene_paths, leftover_assets, user_prompt):
     # 3) Final user message with leftover_assets + user prompt
     final_text = (
         f"Here is the JSON of leftover objects that are not in the new scene:\n\n"
-        f"{json.dumps(leftover_assets, indent=2)}\n\n"
+        f"{dumps_json(leftover_assets)}\n\n"
         f"PROMPT: {user_prompt}\n\n"
         "Please create the groups as described in the developer instructions. "
         "Ensure that the output is strictly valid JSON as specified."
@@ -200,16 +323,16 @@ def build_prompt_messages(scene_paths, leftover_assets, user_prompt):
 """
 HELPER
 
-Removes markdown code fences from the text if present:
-For example, removes ```json ... ``` from the start and end.
+Parses the JSON array in the model's response in a single pass. Decoding starts at the first '['
+and stops at the end of that value, so a ```json fence or trailing text around it is simply
+ignored. Raises json.JSONDecodeError if there is no valid JSON there.
 """
-def strip_code_fences(text: str) -> str:
-    pattern = r'^```json\s*\n(.*)\n```$'
-    match = re.match(pattern, text, re.DOTALL)
-    if match:
-        return match.group(1)
-    else:
-        return text
+def parse_model_json(text: str):
+    start = text.find("[")
+    if start == -1:
+        start = 0
+    parsed, _ = JSON_DECODER.raw_decode(text, start)
+    return parsed
 
 """
 HELPER
@@ -223,17 +346,7 @@ def call_model_for_groups(messages, model_name="gpt-4o"):
             messages=messages,
             temperature=0  # reduce randomness
         )
-        if not response.choices:
-            logging.error("No choices returned from the model.")
-            return ""
-        final_msg = response.choices[0].message
-        if isinstance(final_msg, dict):
-            text_content = final_msg.get("content", "")
-        else:
-            text_content = getattr(final_msg, "content", "")
-        # Strip code fences if present
-        text_content = strip_code_fences(text_content.strip())
-        return text_content
+        return response_text(response)
     except OpenAIError as e:
         logging.error(f"OpenAI error: {e}")
         return ""
@@ -244,22 +357,127 @@ def call_model_for_groups(messages, model_name="gpt-4o"):
 """
 HELPER
 
+Text content of the first choice of a Chat Completions response ("" if there is none).
+"""
+def response_text(response):
+    if not response.choices:
+        logging.error("No choices returned from the model.")
+        return ""
+    final_msg = response.choices[0].message
+    if isinstance(final_msg, dict):
+        text_content = final_msg.get("content", "")
+    else:
+        text_content = getattr(final_msg, "content", "")
+    # Code fences are skipped when the response is parsed
+    return (text_content or "").strip()
+
+"""
+HELPER
+
+Same as call_model_for_groups but for several independent message lists, sent concurrently
+with the async client so their network latency overlaps. Returns the texts in the same order.
+"""
+def call_model_for_groups_batched(message_lists, model_name="gpt-4o"):
+
+    async def call_one(client, messages):
+        try:
+            response = await client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=0  # reduce randomness
+            )
+            return response_text(response)
+        except OpenAIError as e:
+            logging.error(f"OpenAI error: {e}")
+            return ""
+        except Exception as e:
+            logging.error(f"Unexpected error during OpenAI API call: {e}")
+            return ""
+
+    async def call_all():
+        client = openai.AsyncOpenAI(api_key=openai.api_key)
+        try:
+            return await asyncio.gather(*[call_one(client, messages) for messages in message_lists])
+        finally:
+            await client.close()
+
+    return asyncio.run(call_all())
+
+"""
+HELPER
+
+Keeps the groups of `parsed` that have the expected structure.
+"""
+def validate_groups(parsed):
+    valid_groups = []
+    for group in parsed:
+        if not isinstance(group, dict):
+            logging.warning(f"Invalid group format (not a dict): {group}")
+            continue
+        if not all(k in group for k in ["id", "group_name", "assets", "Cloneable"]):
+            logging.warning(f"Group missing required keys: {group}")
+            continue
+        if not isinstance(group["assets"], list):
+            logging.warning(f"'assets' is not a list in group: {group}")
+            continue
+        if not isinstance(group["Cloneable"], bool):
+            logging.warning(f"'Cloneable' is not a boolean in group: {group}")
+            continue
+        valid_groups.append(group)
+    return valid_groups
+
+"""
+HELPER
+
+Merges the group lists of several batched requests into one. Each asset stays in the first group
+that claims it, groups left without assets are dropped and ids are renumbered from 1.
+A single list is returned unchanged.
+"""
+def merge_groups(group_lists):
+    if len(group_lists) == 1:
+        return group_lists[0]
+
+    merged = []
+    seen_assets = set()
+    for groups in group_lists:
+        for group in groups:
+            assets = [ak for ak in group["assets"] if ak not in seen_assets]
+            if not assets:
+                continue
+            seen_assets.update(assets)
+            merged.append({**group, "id": len(merged) + 1, "assets": assets})
+    return merged
+
+"""
+HELPER
+
+Set of every `base` for which some key in `new_scene_objs` starts with `base + '_scaled'`.
+Built once so object_already_in_new_scene doesn't have to scan all new keys per object.
+"""
+def scaled_key_bases(new_scene_objs: dict) -> set:
+    bases = set()
+    for new_key in new_scene_objs:
+        # every "_scaled" occurrence, so keys that already contain "_scaled" in their base still match
+        idx = new_key.find("_scaled")
+        while idx != -1:
+            bases.add(new_key[:idx])
+            idx = new_key.find("_scaled", idx + 1)
+    return bases
+
+"""
+HELPER
+
 Returns True if `orig_key` or any key that starts with `orig_key + '_scaled'`
-is found in `new_scene_objs`.
+is found in `new_scene_objs` (`scaled_bases` is scaled_key_bases(new_scene_objs)).
 """
-def object_already_in_new_scene(orig_key: str, new_scene_objs: dict) -> bool:
+def object_already_in_new_scene(orig_key: str, new_scene_objs: dict, scaled_bases: set) -> bool:
 
     # 1) Check if orig_key is present
     if orig_key in new_scene_objs:
         return True
 
     # 2) Check if we have something like orig_key_scaled or orig_key_scaled_2
-    scaled_prefix = orig_key + "_scaled"
-    for new_key in new_scene_objs.keys():
-        if new_key.startswith(scaled_prefix):
-            return True
-
-    return False
+    return orig_key in scaled_bases
 
 """
 HELPER
@@ -275,53 +493,52 @@ HELPER
 7) Save to asset_group_list.json
 """
 def extract_groups(original_scene_json, new_scene_json, scene_images_dir,
-                   output_json_path, model_name, user_prompt):
+                   output_json_path, model_name, user_prompt, cache_dir=None):
+    # the base64 cache lives next to the output, never inside the (re-rendered) image directory
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(output_json_path)), B64_CACHE_DIR)
 
 
     # 1) Load original scene.json
-    with open(original_scene_json, "r") as f:
-        orig_data = json.load(f)
+    orig_data = load_json(original_scene_json)
 
     # 2) Load new_scene.json
-    with open(new_scene_json, "r") as f:
-        new_data = json.load(f)
+    new_data = load_json(new_scene_json)
 
     orig_obj_dict = orig_data.get("objects", {})
     new_obj_dict = new_data.get("objects", {})
 
     if not orig_obj_dict:
         print("No objects found in original scene.json.")
-        with open(output_json_path, "w") as f:
-            json.dump([], f, indent=4)
+        save_json([], output_json_path)
         return
 
     # 3) Identify leftover objects = in orig but not in new.
+    scaled_bases = scaled_key_bases(new_obj_dict)
     leftover_assets = []
     for key, obj_data in orig_obj_dict.items():
 
-        # skip if already present or scaled in new_scene
-        if object_already_in_new_scene(key, new_obj_dict):
-            continue
-
-        # skip if it's a wall or floor
-        if "wall_type" in obj_data:
-            continue
-        if "floor_description" in obj_data:
+        # skip if it's a wall or floor (cheapest checks first)
+        if "wall_type" in obj_data or "floor_description" in obj_data:
             continue
 
         placements = obj_data.get("placements", [])
         if not placements or not isinstance(placements, list):
             continue
 
+        # skip if already present or scaled in new_scene
+        if object_already_in_new_scene(key, new_obj_dict, scaled_bases):
+            continue
+
         pos = placements[0].get("position", [0, 0, 0])
         if len(pos) < 2:
             pos += [0.0] * (2 - len(pos))
 
-        try:
-            px, py = float(pos[0]), float(pos[1])
-        except (ValueError, TypeError):
+        px, py = pos[0], pos[1]
+        if not isinstance(px, (int, float)) or not isinstance(py, (int, float)):
             logging.warning(f"Invalid position data for object {key}: {pos}")
             continue
+        px, py = float(px), float(py)
 
         ob_type = obj_data.get("object_type", "object")
         ob_name = obj_data.get("object_name", "unknown")
@@ -337,8 +554,7 @@ def extract_groups(original_scene_json, new_scene_json, scene_images_dir,
     if not leftover_assets:
         print("No leftover assets found (either they're all in new_scene or they're walls/floors).")
         logging.info("No leftover assets to group.")
-        with open(output_json_path, "w") as f:
-            json.dump([], f, indent=4)
+        save_json([], output_json_path)
         return
 
     # 4) Load scene images
@@ -347,47 +563,44 @@ def extract_groups(original_scene_json, new_scene_json, scene_images_dir,
         logging.warning("No scene images found. Proceeding without images.")
         scene_paths = []
 
-    # 5) Build messages
-    messages = build_prompt_messages(scene_paths, leftover_assets, user_prompt)
+    # 5) Build messages, one request with every image, or for large scenes one request per
+    # MAX_IMAGES_PER_MESSAGE images that are sent concurrently and merged afterwards
+    if len(scene_paths) > MAX_IMAGES_PER_MESSAGE * 2:
+        message_lists = [
+            build_prompt_messages(chunk, leftover_assets, user_prompt, cache_dir)
+            for chunk in chunk_list(scene_paths, MAX_IMAGES_PER_MESSAGE)
+        ]
+        # 6) Call the model
+        raw_responses = call_model_for_groups_batched(message_lists, model_name=model_name)
+    else:
+        messages = build_prompt_messages(scene_paths, leftover_assets, user_prompt, cache_dir)
+        # 6) Call the model
+        raw_responses = [call_model_for_groups(messages, model_name=model_name)]
 
-    # 6) Call the model
-    raw_response = call_model_for_groups(messages, model_name=model_name)
-    if not raw_response:
+    raw_responses = [raw_response for raw_response in raw_responses if raw_response]
+    if not raw_responses:
         print("No response from model")
-        with open(output_json_path, "w") as f:
-            json.dump([], f, indent=4)
-        return
-
-    # 7) Parse JSON
-    try:
-        parsed = json.loads(raw_response)
-    except json.JSONDecodeError:
-        print("Model Response:")
-        print(raw_response)
-        with open(output_json_path, "w") as f:
-            json.dump([], f, indent=4)
+        save_json([], output_json_path)
         return
 
-    # Validate each group structure
-    valid_groups = []
-    for group in parsed:
-        if not isinstance(group, dict):
-            logging.warning(f"Invalid group format (not a dict): {group}")
-            continue
-        if not all(k in group for k in ["id", "group_name", "assets", "Cloneable"]):
-            logging.warning(f"Group missing required keys: {group}")
-            continue
-        if not isinstance(group["assets"], list):
-            logging.warning(f"'assets' is not a list in group: {group}")
-            continue
-        if not isinstance(group["Cloneable"], bool):
-            logging.warning(f"'Cloneable' is not a boolean in group: {group}")
+    # 7) Parse JSON and validate each group structure
+    group_lists = []
+    for raw_response in raw_responses:
+        try:
+            parsed = parse_model_json(raw_response)
+        except json.JSONDecodeError:
+            print("Model Response:")
+            print(raw_response)
             continue
-        valid_groups.append(group)
+        group_lists.append(validate_groups(parsed))
+
+    if not group_lists:
+        save_json([], output_json_path)
+        return
+    valid_groups = merge_groups(group_lists)
 
     # 8) Write final
-    with open(output_json_path, "w") as f:
-        json.dump(valid_groups, f, indent=4)
+    save_json(valid_groups, output_json_path)
 
 # ---------------------------------------------------------------------
 #                               MAIN
@@ -401,6 +614,7 @@ def main():
     parser.add_argument("--output_json", required=True)
     parser.add_argument("--model_name", default="gpt-4o")
     parser.add_argument("--prompt", default="We are resizing the room. Decide how to group leftover items.")
+    parser.add_argument("--cache_dir", default=None, help="Directory for the base64 cache (default: <output dir>/.cache/b64)")
     args = parser.parse_args()
 
     openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -412,7 +626,8 @@ def main():
         scene_images_dir=args.scene_images_dir,
         output_json_path=args.output_json,
         model_name=args.model_name,
-        user_prompt=args.prompt
+        user_prompt=args.prompt,
+        cache_dir=args.cache_dir
     )
 
 if __name__ == "__main__":
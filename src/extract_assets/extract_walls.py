@@ -30,7 +30,46 @@ import json
 import os
 import sys
 import math
-
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+# numba compiles the grouping + wall_part scan (group_and_scan_walls), the NumPy path is used without it
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# ijson lets extract_walls stream the objects instead of holding all of scene.json in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # ---------------------------------------------------------------------
 #                               HELPERS
@@ -39,26 +78,187 @@ import math
 """
 HELPER
 
-Checks if the 2D distance between posA=(x1,y1) and posB=(x2,y2) is <= threshold.
+Groups the (N,2) wall positions `pos` by proximity. Wall i joins the first (oldest) group that
+already has a wall within `threshold` of it, otherwise it starts a new group. Walls are bucketed
+into a grid of threshold-sized cells, so only the walls in the 9 surrounding cells are compared
+(O(N) expected instead of all pairs). Returns the groups as lists of wall indices.
 """
-def wall_positions_close(posA, posB, threshold=0.5):
-    dx = posA[0] - posB[0]
-    dy = posA[1] - posB[1]
-    dist_sq = dx*dx + dy*dy
-    return dist_sq <= (threshold*threshold)
+def group_wall_positions(pos, threshold=0.5):
+    # a hair bigger than threshold so rounding in the division can't push a close pair 2 cells apart
+    cell = threshold * (1 + 1e-6)
+    thr_sq = threshold*threshold
+    buckets = defaultdict(list)
+
+    groups = []
+    group_of = []
+    for i, (x, y) in enumerate(pos.tolist()):
+        cx, cy = math.floor(x / cell), math.floor(y / cell)
+
+        # lowest group id of the earlier walls close to wall i, that's the first group in the list
+        g = None
+        for nx in (cx - 1, cx, cx + 1):
+            for ny in (cy - 1, cy, cy + 1):
+                for j, (x2, y2) in buckets.get((nx, ny), ()):
+                    dx = x - x2
+                    dy = y - y2
+                    if dx*dx + dy*dy <= thr_sq and (g is None or group_of[j] < g):
+                        g = group_of[j]
+
+        if g is None:
+            g = len(groups)
+            groups.append([i])
+        else:
+            groups[g].append(i)
+        group_of.append(g)
+        buckets[(cx, cy)].append((i, (x, y)))
+    return groups
 
 """
 HELPER
 
-Checks if point (px, py) is within threshold distance of the bounding box in XY.
-bbox = (minX, minY, maxX, maxY).
+Checks which of the (M,2) points `pts` are within threshold distance of the bounding box in XY.
+bbox = (minX, minY, maxX, maxY). Returns an (M,) boolean mask.
 """
-def point_is_near_box(px, py, bbox, threshold=0.3):
+def points_near_box(pts, bbox, threshold=0.3):
     minx, miny, maxx, maxy = bbox
-    cx = max(minx, min(px, maxx))
-    cy = max(miny, min(py, maxy))
-    dist_sq = (cx - px)**2 + (cy - py)**2
-    return dist_sq <= (threshold**2)
+    # cheap reject first: only points inside the box grown by threshold can be close enough
+    near = (
+        (pts[:, 0] >= minx - threshold) & (pts[:, 0] <= maxx + threshold) &
+        (pts[:, 1] >= miny - threshold) & (pts[:, 1] <= maxy + threshold)
+    )
+    idx = np.flatnonzero(near)
+    if len(idx):
+        px = pts[idx, 0]
+        py = pts[idx, 1]
+        cx = np.maximum(minx, np.minimum(px, maxx))
+        cy = np.maximum(miny, np.minimum(py, maxy))
+        dist_sq = (cx - px)**2 + (cy - py)**2
+        near[idx] = dist_sq <= (threshold**2)
+    return near
+
+"""
+HELPER
+
+Compiled version of the whole grouping (same greedy first match and grid of threshold-sized cells as
+group_wall_positions), bounding box unification and wall_part scan (same test as points_near_box), used
+when numba is installed. Returns
+ - group_first: index of the first wall of every group (its representative)
+ - pair_group, pair_part: every (group, wall_part) match, ordered by group then wall_part
+"""
+if njit is not None:
+    # index of cell (x, y) in the sorted unique cells, -1 if no wall is in it
+    @njit(cache=True)
+    def find_cell(cells_x, cells_y, x, y):
+        lo = 0
+        hi = cells_x.shape[0]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cells_x[mid] < x or (cells_x[mid] == x and cells_y[mid] < y):
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < cells_x.shape[0] and cells_x[lo] == x and cells_y[lo] == y:
+            return lo
+        return -1
+
+    @njit(cache=True)
+    def group_and_scan_walls(pos, wl, has_dims, parts_xy, group_threshold, near_threshold):
+        n = pos.shape[0]
+        group_sq = group_threshold*group_threshold
+        group_of = np.empty(n, dtype=np.int64)
+        group_first = np.empty(n, dtype=np.int64)
+        n_groups = 0
+
+        # walls sorted by (cell x, cell y, index), each cell is one run of `order` starting at cell_start
+        cell = group_threshold * (1 + 1e-6)
+        wall_cx = np.empty(n, dtype=np.int64)
+        wall_cy = np.empty(n, dtype=np.int64)
+        for i in range(n):
+            wall_cx[i] = np.int64(math.floor(pos[i, 0] / cell))
+            wall_cy[i] = np.int64(math.floor(pos[i, 1] / cell))
+        order = np.argsort(wall_cy, kind='mergesort')
+        order = order[np.argsort(wall_cx[order], kind='mergesort')]
+        cells_x = np.empty(n, dtype=np.int64)
+        cells_y = np.empty(n, dtype=np.int64)
+        cell_start = np.empty(n + 1, dtype=np.int64)
+        n_cells = 0
+        for t in range(n):
+            w = order[t]
+            if n_cells == 0 or wall_cx[w] != cells_x[n_cells - 1] or wall_cy[w] != cells_y[n_cells - 1]:
+                cells_x[n_cells] = wall_cx[w]
+                cells_y[n_cells] = wall_cy[w]
+                cell_start[n_cells] = t
+                n_cells += 1
+        cell_start[n_cells] = n
+        cells_x = cells_x[:n_cells]
+        cells_y = cells_y[:n_cells]
+
+        for i in range(n):
+            # lowest group id of the earlier walls close to wall i, only the 9 surrounding cells can have them
+            g = -1
+            for nx in range(wall_cx[i] - 1, wall_cx[i] + 2):
+                for ny in range(wall_cy[i] - 1, wall_cy[i] + 2):
+                    c = find_cell(cells_x, cells_y, nx, ny)
+                    if c == -1:
+                        continue
+                    for t in range(cell_start[c], cell_start[c + 1]):
+                        j = order[t]
+                        # indices ascend within a cell, the rest aren't grouped yet
+                        if j >= i:
+                            break
+                        dx = pos[i, 0] - pos[j, 0]
+                        dy = pos[i, 1] - pos[j, 1]
+                        if dx*dx + dy*dy <= group_sq and (g == -1 or group_of[j] < g):
+                            g = group_of[j]
+            if g == -1:
+                g = n_groups
+                group_first[g] = i
+                n_groups += 1
+            group_of[i] = g
+
+        # [minx, miny, maxx, maxy] per group, walls without usable dims don't count
+        boxes = np.empty((n_groups, 4), dtype=np.float64)
+        boxes[:, :2] = np.inf
+        boxes[:, 2:] = -np.inf
+        for i in range(n):
+            if has_dims[i]:
+                g = group_of[i]
+                boxes[g, 0] = min(boxes[g, 0], pos[i, 0])
+                boxes[g, 1] = min(boxes[g, 1], pos[i, 1])
+                boxes[g, 2] = max(boxes[g, 2], pos[i, 0] + wl[i, 0])
+                boxes[g, 3] = max(boxes[g, 3], pos[i, 1] + wl[i, 1])
+
+        # wall_parts near each group box, counted first so the output is allocated once
+        near_sq = near_threshold**2
+        m = parts_xy.shape[0]
+        pair_group = np.empty(0, dtype=np.int64)
+        pair_part = np.empty(0, dtype=np.int64)
+        for fill in range(2):
+            count = 0
+            for g in range(n_groups):
+                minx, miny, maxx, maxy = boxes[g, 0], boxes[g, 1], boxes[g, 2], boxes[g, 3]
+                for k in range(m):
+                    px = parts_xy[k, 0]
+                    py = parts_xy[k, 1]
+                    if px < minx - near_threshold or px > maxx + near_threshold:
+                        continue
+                    if py < miny - near_threshold or py > maxy + near_threshold:
+                        continue
+                    cx = max(minx, min(px, maxx))
+                    cy = max(miny, min(py, maxy))
+                    if (cx - px)**2 + (cy - py)**2 <= near_sq:
+                        if fill:
+                            pair_group[count] = g
+                            pair_part[count] = k
+                        count += 1
+            if not fill:
+                pair_group = np.empty(count, dtype=np.int64)
+                pair_part = np.empty(count, dtype=np.int64)
+
+        return group_first[:n_groups].copy(), pair_group, pair_part
+else:
+    group_and_scan_walls = None
+
 
 
 # ---------------------------------------------------------------------
@@ -68,12 +268,12 @@ def point_is_near_box(px, py, bbox, threshold=0.3):
 """
 MAIN HELPER
 
-Reads scene.json, identifies 'true walls' (objects that have 'wall_type'
+Takes the (key, object) pairs of scene.json, identifies 'true walls' (objects that have 'wall_type'
 but are not floors). Then groups them by checking if their (x,y) positions
 are within 0.1 units. After grouping, for each wall group, find nearby
 'wall_part' objects within ~0.3 distance of that group's bounding box in XY.
 
-Writes 'wall_list.json' with format:
+Returns the contents of 'wall_list.json', format:
 [
     {
     "wall_asset": "someWallKey",
@@ -83,21 +283,40 @@ Writes 'wall_list.json' with format:
     ...
 ]
 """
-def extract_walls(scene_json_path, wall_list_path):
-    with open(scene_json_path, 'r') as f:
-        scene_data = json.load(f)
-
+def get_wall_list(obj_items):
 
     # we need a better way to dect these walls
 
-    objects_dict = scene_data.get("objects", {})
-
-    # 1) Identify all "wall" objects
-    wall_items = []
-    for obj_key, obj_data in objects_dict.items():
-        # Must have wall_type but no floor_description
+    # 1) One pass over the (key, object) pairs: identify all "wall" objects with their (width, length),
+    # and every "wall_part" (not a wall or floor) with a usable position
+    wall_keys = []
+    wall_types = []
+    wall_rows = []
+    dims_rows = []
+    has_dims = []
+    parts_keys = []
+    parts_rows = []
+    for obj_key, obj_data in obj_items:
         if "wall_type" not in obj_data:
+            # if not a 'wall_part' (or a floor), skip
+            if "floor_description" in obj_data:
+                continue
+            if obj_data.get("object_type") != "wall_part":
+                continue
+
+            placements2 = obj_data.get("placements", [])
+            if not placements2:
+                continue
+
+            pos2 = placements2[0].get("position", [0, 0, 0])
+            if len(pos2) < 2:
+                continue
+
+            parts_keys.append(obj_key)
+            parts_rows.append((float(pos2[0]), float(pos2[1])))
             continue
+
+        # Must have wall_type but no floor_description
         if "floor_description" in obj_data:
             continue  # skip if also recognized as a floor
 
@@ -111,93 +330,91 @@ def extract_walls(scene_json_path, wall_list_path):
             pos += [0.0] * (2 - len(pos))
         px, py = float(pos[0]), float(pos[1])
 
-        wall_items.append((obj_key, wtype, (px, py)))
+        wall_keys.append(obj_key)
+        wall_types.append(wtype)
+        wall_rows.append((px, py))
+
+        # walls without usable dims don't count towards their group's box
+        dims = obj_data.get("dimensions", [0, 0, 0])
+        try:
+            dims_rows.append((float(dims[0]), float(dims[1])))
+            has_dims.append(True)
+        except (TypeError, ValueError, IndexError):
+            dims_rows.append((0.0, 0.0))
+            has_dims.append(False)
 
     # 2) Group walls by proximity
     position_threshold = 0.1
-    groups = []
-
-    for witem in wall_items:
-        placed = False
-        for grp in groups:
-            for w2 in grp:
-                if wall_positions_close(witem[2], w2[2], threshold=position_threshold):
-                    grp.append(witem)
-                    placed = True
-                    break
-            if placed:
-                break
-        if not placed:
-            groups.append([witem])
+    pos = np.array(wall_rows, dtype=np.float64).reshape(-1, 2)
+    wl = np.array(dims_rows, dtype=np.float64).reshape(-1, 2)
+    has_dims = np.array(has_dims, dtype=bool)
+    parts_xy = np.array(parts_rows, dtype=np.float64).reshape(-1, 2)
+
+    if group_and_scan_walls is not None:
+        # 3) + 4) grouping, bounding boxes and the wall_part scan in one compiled pass
+        group_first, pair_group, pair_part = group_and_scan_walls(pos, wl, has_dims, parts_xy, position_threshold, 0.3)
+        counts = np.bincount(pair_group, minlength=len(group_first))
+        group_parts = np.split(pair_part, np.cumsum(counts)[:-1])
+        wall_list = []
+        for first, part_idxs in zip(group_first.tolist(), group_parts):
+            wall_list.append({
+                "wall_asset": wall_keys[first],   # representative wall in group
+                "wall_type": wall_types[first],
+                "assets": [parts_keys[i] for i in part_idxs.tolist()]
+            })
+        return wall_list
+
+    groups = group_wall_positions(pos, threshold=position_threshold)
+
+    # [minx, miny, maxx, maxy] of every wall
+    boxes = np.hstack([pos, pos + wl])
 
     # 3) For each group, pick a "main" wall + unify bounding box
     wall_list = []
-    for grp in groups:
-        main_key, main_wtype, main_pos = grp[0]
+    for idxs in groups:
+        main_key, main_wtype = wall_keys[idxs[0]], wall_types[idxs[0]]
         # We'll unify bounding box across all walls in grp
-        group_minx = math.inf
-        group_miny = math.inf
-        group_maxx = -math.inf
-        group_maxy = -math.inf
-
-        for (k, wtype, (wx, wy)) in grp:
-            od = objects_dict.get(k, {})
-            dims = od.get("dimensions", [0, 0, 0])
-            if len(dims) < 2:
-                continue
-            try:
-                width = float(dims[0])
-                length = float(dims[1])
-            except:
-                continue
-            w_minx = wx
-            w_maxx = wx + width
-            w_miny = wy
-            w_maxy = wy + length
-
-            group_minx = min(group_minx, w_minx)
-            group_miny = min(group_miny, w_miny)
-            group_maxx = max(group_maxx, w_maxx)
-            group_maxy = max(group_maxy, w_maxy)
+        grp_boxes = boxes[idxs][has_dims[idxs]]
+        if len(grp_boxes):
+            group_minx, group_miny = grp_boxes[:, :2].min(axis=0).tolist()
+            group_maxx, group_maxy = grp_boxes[:, 2:].max(axis=0).tolist()
+        else:
+            group_minx = math.inf
+            group_miny = math.inf
+            group_maxx = -math.inf
+            group_maxy = -math.inf
 
         group_box = (group_minx, group_miny, group_maxx, group_maxy)
 
-        # 4) Find nearby objects that are "wall_part" only
-        assets_set = set()
-        for ok, od in objects_dict.items():
-            # skip walls + floors
-            if "wall_type" in od:
-                continue
-            if "floor_description" in od:
-                continue
-
-            # if not a 'wall_part', skip
-            if od.get("object_type") != "wall_part":
-                continue
-
-            placements2 = od.get("placements", [])
-            if not placements2:
-                continue
-
-            pos2 = placements2[0].get("position", [0, 0, 0])
-            if len(pos2) < 2:
-                continue
-
-            px2, py2 = float(pos2[0]), float(pos2[1])
-
-            if point_is_near_box(px2, py2, group_box, threshold=0.3):
-                assets_set.add(ok)
+        # 4) Find nearby objects that are "wall_part" only, all candidates tested against the box at once
+        near = points_near_box(parts_xy, group_box, threshold=0.3)
+        assets = [parts_keys[i] for i in np.flatnonzero(near)]
 
         rec = {
             "wall_asset": main_key,   # representative wall in group
             "wall_type": main_wtype,
-            "assets": list(assets_set)
+            "assets": assets
         }
         wall_list.append(rec)
 
+    return wall_list
+
+"""
+MAIN HELPER
+
+File wrapper around get_wall_list. The objects of scene.json are streamed with ijson when it is
+installed (only one pass over them is needed), otherwise the file is loaded whole.
+"""
+def extract_walls(scene_json_path, wall_list_path):
+    if ijson is not None:
+        with open(scene_json_path, 'rb') as f:
+            wall_list = get_wall_list(ijson.kvitems(f, 'objects', use_float=True))
+    else:
+        scene_data = load_json(scene_json_path)
+        wall_list = get_wall_list(scene_data.get("objects", {}).items())
+
     # 5) Save to wall_list.json
-    with open(wall_list_path, 'w') as f:
-        json.dump(wall_list, f, indent=4)
+    save_json(wall_list, wall_list_path)
 
 
 def main():
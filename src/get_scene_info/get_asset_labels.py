@@ -48,15 +48,72 @@ APPROACH
 """
 
 import argparse
+import asyncio
 import os
 import json
 import re
 import time
 import logging
 import base64
+import functools
+import hashlib
+import io
+import mmap
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
 
+# Pillow is only needed to shrink the images before upload, without it the original bytes are sent
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def load_json(path):
+    if orjson is not None:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# written to a temp file and swapped in, so anything reading scene.json meanwhile never sees half a file
+def save_json(data, path, indent=True):
+    tmp_path = path + ".tmp"
+    if orjson is not None:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else 0))
+    else:
+        with open(tmp_path, 'w') as f:
+            if indent:
+                json.dump(data, f, indent=2)
+            else:
+                json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+# One label per line, appended as soon as the label is in so a crash doesn't lose it
+def dump_json_line(data):
+    if orjson is not None:
+        return orjson.dumps(data) + b"\n"
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+def load_json_lines(path):
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line) if orjson is not None else json.loads(line)
+            except ValueError:
+                # last line cut off by the crash
+                continue
+
 
 # BUGGY STEP
 # - Attempt location for newer openai library (>=0.27.x)
@@ -89,6 +146,42 @@ logging.basicConfig(
 
 MAX_ITEMS_PER_MESSAGE = 9
 
+# Label requests in flight at once, and how often the client retries one (e.g. on a 429)
+LABEL_CONCURRENCY = 16
+LABEL_MAX_RETRIES = 5
+
+# Objects of the same kind labeled together in one request
+LABEL_BATCH_SIZE = 8
+
+# Labels are appended to <scene_json> + this while running, so a rerun after a crash can skip them
+LABEL_CACHE_SUFFIX = ".labels.jsonl"
+
+# characters that can't be in a file name
+SANITIZE_RE = re.compile(r'[<>:"/\\|?*]')
+
+# ```json ... ``` fence the model sometimes wraps its answer in
+CODE_FENCE_RE = re.compile(r'^```(?:json)?\s*\n(.*)\n```$', re.DOTALL)
+
+# Threads used to scan the asset image folders and read + encode the images
+IMAGE_IO_WORKERS = 8
+
+# Encoded images by (content digest, detail), the ENCODED_CACHE_SIZE most recently used are kept.
+# Shared by the encoder threads, hence the lock
+ENCODED_CACHE_SIZE = 256
+ENCODED_BY_DIGEST = OrderedDict()
+ENCODED_BY_DIGEST_LOCK = threading.Lock()
+
+# Field of scene.json each kind of object (see classify_object) gets its label in
+LABEL_FIELDS = {
+    "wall": "wall_type",
+    "floor": "floor_description",
+    "asset": "object_name"
+}
+
+# Images are downscaled to this longest side and re-encoded as JPEG before base64
+MAX_IMAGE_SIDE = 1024
+IMAGE_JPEG_QUALITY = 85
+
 # ---------------------------------------------------------------------
 #                               HELPERS
 # ---------------------------------------------------------------------
@@ -99,48 +192,50 @@ HELPER
 Definitely will make a global utils function, got really lazy
 """
 def sanitize_filename(filename: str) -> str:
-    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+    return SANITIZE_RE.sub('_', filename)
 
 """
 HELPER
 
-Check if asset is a wall
-We do the stripping stuff because if the blend is named "wall" then all assets would be classified as a wall
+Classify an asset as "wall", "floor" (key contains "room") or "asset", from its key lowercased once.
+We do the stripping stuff because if the blend is named "wall" then all assets would be classified as a wall,
+`blend_prefix` is blend_name + "-"
 """
-def is_wall(obj_key: str, blend_name: str) -> bool:
-    if obj_key.startswith(blend_name + "-"):
-        obj_key_stripped = obj_key[len(blend_name) + 1:]
+def classify_object(obj_key: str, blend_prefix: str) -> str:
+    if obj_key.startswith(blend_prefix):
+        obj_key_stripped = obj_key[len(blend_prefix):].lower()
     else:
-        obj_key_stripped = obj_key
-    return 'wall' in obj_key_stripped.lower()
+        obj_key_stripped = obj_key.lower()
+    if 'wall' in obj_key_stripped:
+        return "wall"
+    if 'room' in obj_key_stripped:
+        return "floor"
+    return "asset"
 
 """
 HELPER
 
-Check if asset is a floor, will combine this and wall into a global func
+Load images for the entire scene
 """
-def is_floor(obj_key: str, blend_name: str) -> bool:
-    if obj_key.startswith(blend_name + "-"):
-        obj_key_stripped = obj_key[len(blend_name) + 1:]
-    else:
-        obj_key_stripped = obj_key
-    return 'room' in obj_key_stripped.lower()
+def load_scene_images(scene_images_dir: str) -> list:
+    return list_image_files(scene_images_dir)
 
 """
 HELPER
 
-Load images for the entire scene
+Sorted paths of the .png/.jpg/.jpeg files in `images_dir` ([] if it isn't a directory). One scandir
+pass, DirEntry.is_file() uses the type from the directory listing instead of a stat per file
 """
-def load_scene_images(scene_images_dir: str) -> list:
-    scene_images_paths = []
-    if os.path.isdir(scene_images_dir):
-        for image_file in sorted(os.listdir(scene_images_dir)):
-            lower = image_file.lower()
-            if lower.endswith(('.png', '.jpg', '.jpeg')):
-                image_path = os.path.join(scene_images_dir, image_file)
-                if os.path.isfile(image_path):
-                    scene_images_paths.append(image_path)
-    return scene_images_paths
+def list_image_files(images_dir: str) -> list:
+    if not os.path.isdir(images_dir):
+        return []
+    with os.scandir(images_dir) as it:
+        image_paths = [
+            entry.path for entry in it
+            if entry.name.lower().endswith(('.png', '.jpg', '.jpeg')) and entry.is_file()
+        ]
+    image_paths.sort()
+    return image_paths
 
 """
 HELPER
@@ -154,68 +249,168 @@ def chunk_list(lst, chunk_size):
 """
 HELPER
 
+Image file re-encoded as JPEG with its longest side at most MAX_IMAGE_SIDE, or None if Pillow isn't
+installed or can't read it. Keeps what the model actually looks at while shrinking the upload a lot
+"""
+def read_image_as_jpeg(path: str):
+    if Image is None:
+        return None
+    try:
+        with Image.open(path) as img:
+            img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        return buf.getvalue()
+    except OSError as e:
+        logging.warning(f"Could not re-encode {path}, sending it as is: {e}")
+        return None
+
+"""
+HELPER
+
 Base64 encode image file, the returns a dictionary for the chat completion for OpenAI API
 """
 def encode_image_as_data_url(path: str, detail: str = "auto") -> dict:
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
-    return {
+    return encode_image_as_data_url_cached(path, os.stat(path).st_mtime_ns, detail)
+
+# keyed on the mtime too, so an image rewritten on disk is encoded again
+@functools.lru_cache(maxsize=256)
+def encode_image_as_data_url_cached(path: str, mtime_ns: int, detail: str) -> dict:
+    # identical files (e.g. the same thumbnail in several asset folders) are only encoded once
+    key = (file_digest(path), detail)
+    with ENCODED_BY_DIGEST_LOCK:
+        encoded = ENCODED_BY_DIGEST.get(key)
+        if encoded is not None:
+            ENCODED_BY_DIGEST.move_to_end(key)
+            return encoded
+
+    data = read_image_as_jpeg(path)
+    if data is not None:
+        b64 = base64.b64encode(data).decode("utf-8")
+    else:
+        # base64 straight out of a read-only mmap, no intermediate bytes copy of the file
+        with open(path, "rb") as f:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    b64 = base64.b64encode(mm).decode("utf-8")
+            except ValueError:
+                # empty files can't be mapped
+                b64 = ""
+    encoded = {
         "type": "image_url",
         "image_url": {
             "url": f"data:image/jpeg;base64,{b64}",
             "detail": detail
         }
     }
+    with ENCODED_BY_DIGEST_LOCK:
+        ENCODED_BY_DIGEST[key] = encoded
+        if len(ENCODED_BY_DIGEST) > ENCODED_CACHE_SIZE:
+            ENCODED_BY_DIGEST.popitem(last=False)
+    return encoded
+
+"""
+HELPER
+
+blake2b digest of the file's content, hashed straight out of a read-only mmap
+"""
+def file_digest(path: str) -> bytes:
+    with open(path, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.blake2b(mm, digest_size=16).digest()
+        except ValueError:
+            # empty files can't be mapped
+            return hashlib.blake2b(b"", digest_size=16).digest()
+
+"""
+HELPER
+
+"user" messages containing the scene images in chunks. The scene images are the same for every
+object, so these are built once and shared by all the label requests
+"""
+def build_scene_image_messages(scene_paths: list) -> list:
+    scene_messages = []
+    for chunk in chunk_list(scene_paths, MAX_ITEMS_PER_MESSAGE):
+        content_chunk = []
+        for spath in chunk:
+            content_chunk.append(encode_image_as_data_url(spath, detail="low"))
+        scene_messages.append({
+            "role": "user",
+            "content": content_chunk
+        })
+    return scene_messages
 
 """
 HELPER
 
 1) "developer" message with overall instructions
-2) One or more "user" messages containing chunks of scene images
-3) One or more "user" messages containing chunks of asset images
+2) One or more "user" messages containing chunks of scene images (from build_scene_image_messages)
+3) One or more "user" messages containing chunks of asset images, `asset_path_lists` has the images of
+   each asset. With more than one asset, each one's images are preceded by an "Asset #i:" message
 4) One final "user" message with the text prompt
 """
-def build_chunked_image_messages(scene_paths: list, asset_paths: list, text_prompt: str) -> list:
+def build_batched_image_messages(scene_messages: list, asset_path_lists: list, text_prompt: str) -> list:
+    if len(asset_path_lists) > 1:
+        # several assets: an array with one indexed entry per asset, so the instructions can't contradict the prompt
+        developer_text = (
+            "You are an assistant that visually analyzes images of a room "
+            "and several assets, identifying objects, walls, or floors. "
+            "Please return strictly valid JSON: an array with one entry per asset. Each entry has "
+            "an \"index\" key with the asset's number from its \"Asset #i:\" message, plus "
+            "\"object_name\" and \"object_type\" if labeling assets, \"wall_type\" if labeling walls, "
+            "or \"floor_description\" if labeling floors. "
+            "No additional keys should appear. Example:\n"
+            "[{\"index\":0,\"object_name\":\"chair\",\"object_type\":\"object\"},"
+            "{\"index\":1,\"object_name\":\"lamp\",\"object_type\":\"object\"}]\n"
+            "Do not include markdown in your output."
+        )
+    else:
+        developer_text = (
+            "You are an assistant that visually analyzes images of a room "
+            "and an asset, identifying objects, walls, or floors. "
+            "Please return strictly valid JSON. If labeling an asset, return "
+            "JSON with \"object_name\" and \"object_type\". If labeling a wall, "
+            "return \"wall_type\". If labeling a floor, return \"floor_description\". "
+            "No additional keys should appear. Example:\n"
+            "{\"object_name\":\"chair\",\"object_type\":\"object\"}\n"
+            "Do not include markdown in your output."
+        )
     messages = [
         {
             "role": "developer",
             "content": [
                 {
                     "type": "text",
-                    "text": (
-                        "You are an assistant that visually analyzes images of a room "
-                        "and an asset, identifying objects, walls, or floors. "
-                        "Please return strictly valid JSON. If labeling an asset, return "
-                        "JSON with \"object_name\" and \"object_type\". If labeling a wall, "
-                        "return \"wall_type\". If labeling a floor, return \"floor_description\". "
-                        "No additional keys should appear. Example:\n"
-                        "{\"object_name\":\"chair\",\"object_type\":\"object\"}\n"
-                        "Do not include markdown in your output."
-                    )
+                    "text": developer_text
                 }
             ]
         }
     ]
 
     # Scene images in chunks
-    for chunk in chunk_list(scene_paths, MAX_ITEMS_PER_MESSAGE):
-        content_chunk = []
-        for spath in chunk:
-            content_chunk.append(encode_image_as_data_url(spath, detail="low"))
-        messages.append({
-            "role": "user",
-            "content": content_chunk
-        })
-
-    # Asset images in chunks
-    for chunk in chunk_list(asset_paths, MAX_ITEMS_PER_MESSAGE):
-        content_chunk = []
-        for apath in chunk:
-            content_chunk.append(encode_image_as_data_url(apath, detail="high"))
-        messages.append({
-            "role": "user",
-            "content": content_chunk
-        })
+    messages.extend(scene_messages)
+
+    # Asset images in chunks, each asset introduced by its number if there are several
+    for asset_idx, asset_paths in enumerate(asset_path_lists):
+        if len(asset_path_lists) > 1:
+            messages.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Asset #{asset_idx}:"
+                    }
+                ]
+            })
+        for chunk in chunk_list(asset_paths, MAX_ITEMS_PER_MESSAGE):
+            content_chunk = []
+            for apath in chunk:
+                content_chunk.append(encode_image_as_data_url(apath, detail="high"))
+            messages.append({
+                "role": "user",
+                "content": content_chunk
+            })
 
     # Final user message with text prompt
     messages.append({
@@ -233,10 +428,10 @@ def build_chunked_image_messages(scene_paths: list, asset_paths: list, text_prom
 """
 HELPER
 
-Sends the given messages to chat.completions.create, returns the text from the assistant. If there's no text, returns "".
+Sends the given messages to chat.completions.create on the async `client`, returns the text from the assistant. If there's no text, returns "".
 """
-def run_label_request(model_name: str, messages: list) -> str:
-    response = openai.chat.completions.create(
+async def run_label_request(client, model_name: str, messages: list) -> str:
+    response = await client.chat.completions.create(
         model=model_name,
         messages=messages,
         store=True
@@ -252,6 +447,231 @@ def run_label_request(model_name: str, messages: list) -> str:
 
     return text_content
 
+"""
+HELPER
+
+Prompt for labeling a single object of kind `obj_type`
+"""
+def label_prompt(obj_type: str) -> str:
+    if obj_type == "asset":
+        return (
+            "You have multiple room (scene) images plus the asset images. "
+            "Identify the what the asset is in the asset images. Also choose an "
+            "\"object_type\" from [object, wall_part, light_fixture]. "
+            "A wall_part should be like things that could qualify as a wall or part of a wall, like a finish of a wall, a door, a window, a large panel, etc."
+            "An object is anything else, like furniture or things in a room. "
+            "A light_fixture is a light that hangs from the cieling"
+            "Use the scene images as clues to help you determine the typ of the asset."
+            "if you don't know the object_type, default to object"
+            "Return strictly valid JSON, for example:\n"
+            "{\"object_name\":\"bed\",\"object_type\":\"object\"}"
+        )
+    elif obj_type == "wall":
+        return (
+            "You have room images and a wall image. Choose a \"wall_tye\" from [hallway, door, window, solid_wall, open_wall]"
+            "Where solid_wall is a wall that has no holes"
+            "And open_wall is a wall that has holes but we can’t further classify it"
+            "Identify the wall type and respond "
+            "with valid JSON. Example:\n"
+            "{\"wall_type\":\"door\"}"
+        )
+    elif obj_type == "floor":
+        return (
+            "You have room images plus a floor image. Describe the floor and respond "
+            "with valid JSON. Example:\n"
+            "{\"floor_description\":\"gray tile\"}"
+        )
+    else:
+        return "Analyze these images and return JSON describing the object."
+
+"""
+HELPER
+
+Prompt for labeling `n_assets` objects of kind `obj_type` in one request
+"""
+def batched_label_prompt(obj_type: str, n_assets: int) -> str:
+    return (
+        label_prompt(obj_type) + "\n\n"
+        f"This time there are {n_assets} assets, the images of each one are introduced by \"Asset #i:\". "
+        "Label every asset as described above and return a JSON array with one entry per asset, each entry "
+        "being the JSON described above plus an \"index\" key with the asset's number i, for example:\n"
+        "[{\"index\":0, ...}, {\"index\":1, ...}]"
+    )
+
+"""
+HELPER
+
+Parses the model's JSON answer, with orjson if it's installed. A ```json fence around it is dropped first.
+Raises json.JSONDecodeError (orjson's error is a subclass of it) if the answer isn't valid JSON
+"""
+def parse_json_response(text: str):
+    text = text.strip()
+    if text.startswith("```"):
+        match = CODE_FENCE_RE.match(text)
+        if match:
+            text = match.group(1)
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+"""
+HELPER
+
+(final_label, final_object_type) from the parsed JSON answer for one object of kind `obj_type`
+"""
+def parse_label(obj_type: str, parsed: dict):
+    if obj_type == "asset":
+        final_label = parsed.get("object_name", "unknown")
+        final_object_type = parsed.get("object_type", "object")
+    elif obj_type == "wall":
+        final_label = parsed.get("wall_type", "unknown")
+        final_object_type = None
+    elif obj_type == "floor":
+        desc = parsed.get("floor_description", "unknown")
+        final_label = desc
+        final_object_type = None
+    else:
+        final_label = "unknown"
+        final_object_type = "object"
+    return final_label, final_object_type
+
+"""
+HELPER
+
+Labels a batch of objects of the same kind `obj_type` in one request, `batch` is a list of
+(obj_key, asset_paths). A batch of one is sent with the single object prompt.
+Returns {obj_key: (final_label, final_object_type)} for the objects the model actually labeled,
+the caller asks for the rest of a batch one at a time and falls back to 'unknown' after that.
+"""
+async def label_batch(client, model_name, obj_type, batch, scene_messages, executor):
+    for obj_key, _ in batch:
+        logging.info(f"Processing object: {obj_key}")
+
+    # 5) Build the relevant prompt, the asset images are encoded on `executor` so other requests
+    # keep going on the event loop meanwhile
+    if len(batch) == 1:
+        prompt_text = label_prompt(obj_type)
+    else:
+        prompt_text = batched_label_prompt(obj_type, len(batch))
+    messages = await asyncio.get_running_loop().run_in_executor(
+        executor, build_batched_image_messages,
+        scene_messages, [asset_paths for _, asset_paths in batch], prompt_text
+    )
+    response_text = await run_label_request(client, model_name, messages)
+
+    if not response_text:
+        for obj_key, _ in batch:
+            print(f"No assistant message found for {obj_key} => 'unknown'.")
+        return {}
+
+    # 6) Attempt JSON parse
+    try:
+        parsed = parse_json_response(response_text)
+    except json.JSONDecodeError:
+        for obj_key, _ in batch:
+            print(f"  Could not parse JSON for {obj_key} => 'unknown'.")
+        return {}
+
+    if len(batch) == 1:
+        return {batch[0][0]: parse_label(obj_type, parsed)}
+
+    # answers of a batch are matched to the objects by their index, a lone object counts as a one entry array
+    if isinstance(parsed, dict):
+        parsed = [parsed]
+    by_index = {}
+    if isinstance(parsed, list):
+        for entry in parsed:
+            if isinstance(entry, dict) and isinstance(entry.get("index"), int):
+                by_index[entry["index"]] = entry
+
+    labels = {}
+    for asset_idx, (obj_key, _) in enumerate(batch):
+        entry = by_index.get(asset_idx)
+        if entry is None:
+            print(f"  No label returned for {obj_key} in its batch, asking for it on its own.")
+        else:
+            labels[obj_key] = parse_label(obj_type, entry)
+    return labels
+
+"""
+HELPER
+
+Labels every object of `objects_dict` with the async client. Objects of the same kind are sent
+LABEL_BATCH_SIZE at a time in one request, and the requests run concurrently with at most
+LABEL_CONCURRENCY in flight. Objects found in `cached_labels` ({obj_key: (final_label, final_object_type)}
+from an earlier, interrupted run) aren't sent again, every new label is appended to `label_cache`
+as soon as its request is done. Returns (obj_type, label_field, final_label, final_object_type)
+for each object, in the order of `objects_dict`.
+"""
+async def label_objects(model_name, objects_dict, scene_messages, asset_images_dir, blend_name,
+                        cached_labels, label_cache):
+    blend_prefix = blend_name + "-"
+    obj_types = {}
+    labels = {}
+    # objects with images to label, per kind
+    to_label = {}
+    pending_keys = []
+    for obj_key in objects_dict:
+        obj_types[obj_key] = classify_object(obj_key, blend_prefix)
+
+        if obj_key in cached_labels:
+            logging.info(f"Reusing cached label for object: {obj_key}")
+            labels[obj_key] = cached_labels[obj_key]
+        else:
+            pending_keys.append(obj_key)
+
+    # threads for the image folder scans + base64 encoding, the file I/O of one overlaps the others
+    executor = ThreadPoolExecutor(max_workers=IMAGE_IO_WORKERS)
+
+    # 4) Gather asset images for every object
+    all_asset_paths = executor.map(
+        lambda obj_key: list_image_files(os.path.join(asset_images_dir, sanitize_filename(obj_key))),
+        pending_keys
+    )
+    for obj_key, asset_paths in zip(pending_keys, all_asset_paths):
+        obj_type = obj_types[obj_key]
+
+        # If no images => "unknown"
+        if not asset_paths:
+            print(f"No images for object: {obj_key} => 'unknown'")
+            labels[obj_key] = ("unknown", "object")
+        else:
+            to_label.setdefault(obj_type, []).append((obj_key, asset_paths))
+
+    # rate limits (429) are retried with backoff by the client itself
+    client = openai.AsyncOpenAI(api_key=openai.api_key, max_retries=LABEL_MAX_RETRIES)
+    sem = asyncio.Semaphore(LABEL_CONCURRENCY)
+
+    async def bounded(obj_type, batch):
+        async with sem:
+            batch_labels = await label_batch(client, model_name, obj_type, batch, scene_messages, executor)
+        # persisted right away, so a later failure doesn't lose these
+        for obj_key, (final_label, final_object_type) in batch_labels.items():
+            label_cache.write(dump_json_line({"key": obj_key, "label": final_label, "object_type": final_object_type}))
+        label_cache.flush()
+        os.fsync(label_cache.fileno())
+        labels.update(batch_labels)
+
+        # whatever a batched answer left out (or the whole batch, if it couldn't be used) is sent on its own
+        missed = [item for item in batch if item[0] not in batch_labels]
+        if len(batch) > 1 and missed:
+            await asyncio.gather(*[bounded(obj_type, [item]) for item in missed])
+
+    try:
+        await asyncio.gather(*[
+            bounded(obj_type, batch)
+            for obj_type, objs in to_label.items()
+            for batch in chunk_list(objs, LABEL_BATCH_SIZE)
+        ])
+    finally:
+        await client.close()
+        executor.shutdown()
+
+    return [
+        (obj_types[obj_key], LABEL_FIELDS[obj_types[obj_key]]) + labels.get(obj_key, ("unknown", "object"))
+        for obj_key in objects_dict
+    ]
+
 # ---------------------------------------------------------------------
 #                               MAIN
 # ---------------------------------------------------------------------
@@ -276,115 +696,39 @@ def main():
 
     openai.api_key = openai_api_key
 
-    # 1) Load scene images
+    # 1) Load scene images, encoded once for all the objects
     scene_paths = load_scene_images(scene_images_dir)
+    scene_messages = build_scene_image_messages(scene_paths)
 
     # 2) Load scene.json
-    with open(scene_json_path, "r") as f:
-        scene_data = json.load(f)
+    scene_data = load_json(scene_json_path)
     objects_dict = scene_data.get("objects", {})
 
-    # 3) Process each object
-    for obj_key, obj_details in objects_dict.items():
-        logging.info(f"Processing object: {obj_key}")
-
-        if is_wall(obj_key, blend_name):
-            obj_type = "wall"
-            label_field = "wall_type"
-        elif is_floor(obj_key, blend_name):
-            obj_type = "floor"
-            label_field = "floor_description"
-        else:
-            obj_type = "asset"
-            label_field = "object_name"
-
-        # 4) Gather asset images for this object
-        obj_folder = sanitize_filename(obj_key)
-        obj_path = os.path.join(asset_images_dir, obj_folder)
-        asset_paths = []
-        if os.path.isdir(obj_path):
-            for image_file in sorted(os.listdir(obj_path)):
-                lower = image_file.lower()
-                if lower.endswith(('.png', '.jpg', '.jpeg')):
-                    fullp = os.path.join(obj_path, image_file)
-                    if os.path.isfile(fullp):
-                        asset_paths.append(fullp)
-
-        # If no images => "unknown"
-        if not asset_paths:
-            print(f"No images for object: {obj_key} => 'unknown'")
-            final_label = "unknown"
-            final_object_type = "object"
-        else:
-            # 5) Build the relevant prompt
-            if obj_type == "asset":
-                prompt_text = (
-                    "You have multiple room (scene) images plus the asset images. "
-                    "Identify the what the asset is in the asset images. Also choose an "
-                    "\"object_type\" from [object, wall_part, light_fixture]. "
-                    "A wall_part should be like things that could qualify as a wall or part of a wall, like a finish of a wall, a door, a window, a large panel, etc."
-                    "An object is anything else, like furniture or things in a room. "
-                    "A light_fixture is a light that hangs from the cieling"
-                    "Use the scene images as clues to help you determine the typ of the asset."
-                    "if you don't know the object_type, default to object"
-                    "Return strictly valid JSON, for example:\n"
-                    "{\"object_name\":\"bed\",\"object_type\":\"object\"}"
-                )
-            elif obj_type == "wall":
-                prompt_text = (
-                    "You have room images and a wall image. Choose a \"wall_tye\" from [hallway, door, window, solid_wall, open_wall]"
-                    "Where solid_wall is a wall that has no holes"
-                    "And open_wall is a wall that has holes but we can’t further classify it"
-                    "Identify the wall type and respond "
-                    "with valid JSON. Example:\n"
-                    "{\"wall_type\":\"door\"}"
-                )
-            elif obj_type == "floor":
-                prompt_text = (
-                    "You have room images plus a floor image. Describe the floor and respond "
-                    "with valid JSON. Example:\n"
-                    "{\"floor_description\":\"gray tile\"}"
-                )
-            else:
-                prompt_text = "Analyze these images and return JSON describing the object."
-
-            messages = build_chunked_image_messages(scene_paths, asset_paths, prompt_text)
-            response_text = run_label_request(model_name, messages)
-
-            if not response_text:
-                print(f"No assistant message found for {obj_key} => 'unknown'.")
-                final_label = "unknown"
-                final_object_type = "object"
-            else:
-                # 6) Attempt JSON parse
-                try:
-                    parsed = json.loads(response_text)
-                    if obj_type == "asset":
-                        final_label = parsed.get("object_name", "unknown")
-                        final_object_type = parsed.get("object_type", "object")
-                    elif obj_type == "wall":
-                        final_label = parsed.get("wall_type", "unknown")
-                        final_object_type = None
-                    elif obj_type == "floor":
-                        desc = parsed.get("floor_description", "unknown")
-                        final_label = desc
-                        final_object_type = None
-                    else:
-                        final_label = "unknown"
-                        final_object_type = "object"
-                except json.JSONDecodeError:
-                    print(f"  Could not parse JSON for {obj_key} => 'unknown'.")
-                    final_label = "unknown"
-                    final_object_type = "object"
-
+    # 3) Process each object, reusing the labels a crashed earlier run already got
+    label_cache_path = scene_json_path + LABEL_CACHE_SUFFIX
+    cached_labels = {}
+    if os.path.exists(label_cache_path):
+        for record in load_json_lines(label_cache_path):
+            cached_labels[record["key"]] = (record["label"], record["object_type"])
+    with open(label_cache_path, "ab") as label_cache:
+        # a line cut off by a crash gets terminated so the new labels start on their own line,
+        # blank lines are skipped when loading
+        if label_cache.tell():
+            label_cache.write(b"\n")
+        results = asyncio.run(label_objects(
+            model_name, objects_dict, scene_messages, asset_images_dir, blend_name,
+            cached_labels, label_cache
+        ))
+
+    for obj_key, (obj_type, label_field, final_label, final_object_type) in zip(objects_dict, results):
         # 7) Update scene.json for this object
         scene_data["objects"][obj_key][label_field] = final_label
         if obj_type == "asset":
             scene_data["objects"][obj_key]["object_type"] = final_object_type
 
-    # 8) Save updated scene.json
-    with open(scene_json_path, "w") as f:
-        json.dump(scene_data, f, indent=4)
+    # 8) Save updated scene.json, the labels are in there now so the cache isn't needed anymore
+    save_json(scene_data, scene_json_path)
+    os.remove(label_cache_path)
     print("\nFinished labeling")
 
 if __name__ == "__main__":
@@ -11,7 +11,7 @@ INPUTS
  - blend_file: Path to a .blend file to append additional objects, or the original blend scene to take images of the entire scene
 
 OUTPUTS
- - asset_images/: 4 images for each asset from multiple angles.
+ - asset_images/: 4 images (JPEG) for each asset from multiple angles.
  - scene_image/: 9 images for the entire scene render
 
 
@@ -52,6 +52,51 @@ import argparse
 import re
 import mathutils
 import math
+import functools
+
+import numpy as np
+
+# optional in Blender's bundled Python, see load_object_keys
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# characters that can't be in a file name
+SANITIZE_RE = re.compile(r'[<>:"/\\|?*]')
+
+# Camera views as (view_name, normalized direction, zoom_increment), the directions are normalized
+# once here instead of for every asset (and frozen, so nothing can change them in place)
+def make_views(views):
+    return tuple(
+        (view_name, mathutils.Vector(direction).normalized().freeze(), zoom_increment)
+        for view_name, direction, zoom_increment in views
+    )
+
+# individual assets
+PRODUCT_VIEWS = make_views((
+    ("angled_view_1", (1, -1, 1), 1.0),
+    ("angled_view_2", (-1, -1, 1), 1.2),
+    ("angled_view_3", (-1,  1, 1), 1.4),
+    ("angled_view_4", ( 1,  1, 1), 1.6),
+))
+
+# entire scene, angled from the top
+SCENE_ANGLED_VIEWS = make_views((
+    ("scene_view_1", (1, -1, 1), 0.8),
+    ("scene_view_2", (-1, -1, 1), 0.9),
+    ("scene_view_3", (-1, 1, 1),  1.0),
+    ("scene_view_4", (1, 1, 1),   1.1),
+))
+
+# entire scene, top-down and the cardinal directions
+SCENE_EXTRA_VIEWS = make_views((
+    ("birdseye_top", (0, 0, 1), 1.0),
+    ("north_view", (0, 1, 0), 1.0),
+    ("south_view", (0, -1, 0), 1.0),
+    ("east_view", (1, 0, 0), 1.0),
+    ("west_view", (-1, 0, 0), 1.0),
+))
 
 # ---------------------------------------------------------------------
 #                               HELPERS
@@ -62,20 +107,60 @@ HELPER
 
 cleans filename
 """
+@functools.lru_cache(maxsize=4096)
 def sanitize_filename(filename):
-    return re.sub(r'[<>:"/\\|?*]', '_', filename)
+    return SANITIZE_RE.sub('_', filename)
+
+# objects imported by import_glb since the last clear_scene, the only ones a regular clear has to remove
+_last_imported = []
+# the meshes/materials/images left behind by removed objects are purged every ORPHAN_PURGE_INTERVAL clears
+ORPHAN_PURGE_INTERVAL = 16
+_clears_since_purge = 0
+# the first clear wipes the startup scene (default cube, camera, light) completely
+_scene_cleared = False
+# lights added by setup_lighting, kept across the per-asset clears
+_lighting_rig = []
+# Render settings for configure_eevee, the asset thumbnails get fewer samples and 75% of the resolution
+RENDER_RESOLUTION = (1920, 1080)
+ASSET_RENDER_SAMPLES = 8
+ASSET_RESOLUTION_PERCENTAGE = 75
+SCENE_RENDER_SAMPLES = 32
+
+# The asset thumbnails are written as JPEGs (they're re-encoded as JPEG for the VLM anyway), the scene
+# views stay PNG with a light compression level so less time goes into encoding them
+JPEG_QUALITY = 90
+PNG_COMPRESSION = 15
 
 """
 HELPER
 
 Clears blender scene
+
+Between assets only the previously imported objects are removed (one batch_remove instead of the select/delete
+operators), their orphaned data is purged periodically. full=True (and the very first call) clears everything
 """
-def clear_scene():
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
-    for bpy_data_iter in (bpy.data.meshes, bpy.data.cameras, bpy.data.lights, bpy.data.images):
-        for id_data in bpy_data_iter:
-            bpy_data_iter.remove(id_data, do_unlink=True)
+def clear_scene(full=False):
+    global _clears_since_purge, _scene_cleared
+    if full or not _scene_cleared:
+        bpy.ops.object.select_all(action='SELECT')
+        bpy.ops.object.delete(use_global=False)
+        for bpy_data_iter in (bpy.data.meshes, bpy.data.cameras, bpy.data.lights, bpy.data.images):
+            for id_data in bpy_data_iter:
+                bpy_data_iter.remove(id_data, do_unlink=True)
+        _last_imported.clear()
+        _lighting_rig.clear()
+        _clears_since_purge = 0
+        _scene_cleared = True
+        return
+
+    if _last_imported:
+        bpy.data.batch_remove(ids=_last_imported)
+        _last_imported.clear()
+
+    _clears_since_purge += 1
+    if _clears_since_purge >= ORPHAN_PURGE_INTERVAL:
+        bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+        _clears_since_purge = 0
 
 """
 HELPER
@@ -84,7 +169,15 @@ Adds the glb to the scene
 """
 def import_glb(glb_path):
     bpy.ops.import_scene.gltf(filepath=glb_path)
-    return bpy.context.selected_objects
+    imported = list(bpy.context.selected_objects)
+
+    # lights that come with the glb would change the thumbnails, only the lighting rig lights the asset
+    glb_lights = [obj for obj in imported if obj.type == 'LIGHT']
+    if glb_lights:
+        bpy.data.batch_remove(ids=glb_lights)
+        imported = [obj for obj in imported if obj not in glb_lights]
+    _last_imported.extend(imported)
+    return imported
 
 """
 HELPER
@@ -112,14 +205,37 @@ Adds camera to scene and points it at target
  - fov_deg: camera FOV
 """
 def setup_camera(location, look_at, fov_deg=50):
-    bpy.ops.object.camera_add(location=location)
-    camera = bpy.context.object
-    camera.data.angle = math.radians(fov_deg)
+    # built straight from bpy.data, the camera_add operator re-checks the context and pushes an undo step every call
+    cam_data = bpy.data.cameras.new("camera")
+    cam_data.angle = math.radians(fov_deg)
+    camera = bpy.data.objects.new("camera", cam_data)
+    bpy.context.scene.collection.objects.link(camera)
+    point_camera(camera, location, look_at)
+    bpy.context.scene.camera = camera
+    return camera
+
+"""
+HELPER
+
+Moves the camera to location and points it at look_at
+"""
+def point_camera(camera, location, look_at):
+    camera.location = location
     direction = look_at - location
     rot_quat = direction.to_track_quat('-Z', 'Y')
     camera.rotation_euler = rot_quat.to_euler()
-    bpy.context.scene.camera = camera
-    return camera
+
+"""
+HELPER
+
+Adds a light object of light_type at location, built from bpy.data like the cameras
+"""
+def add_light(light_type, location):
+    light_data = bpy.data.lights.new(light_type.lower(), type=light_type)
+    light = bpy.data.objects.new(light_type.lower(), light_data)
+    light.location = location
+    bpy.context.scene.collection.objects.link(light)
+    return light
 
 """
 HELPER
@@ -133,44 +249,123 @@ Set up lighting with key, fill, and back lights
 Used GPT for this, not sure what the consensus is for these terms or this method to light a scene but it was sufficient to make the objects visible. May not need to be this complicated though.
 """
 def setup_lighting():
+    # the rig survives the per-asset clear_scene, it's only rebuilt after a full clear
+    if _lighting_rig:
+        return
+
     # Remove existing lights
     for obj in bpy.data.objects:
         if obj.type == 'LIGHT':
             bpy.data.objects.remove(obj, do_unlink=True)
 
     # Key light (Sun)
-    bpy.ops.object.light_add(type='SUN', location=(5, -5, 10))
-    sun = bpy.context.object
+    sun = add_light('SUN', (5, -5, 10))
     sun.data.energy = 3.0
     sun.rotation_euler = (math.radians(45), 0, math.radians(45))
 
     # Fill light (Area)
-    bpy.ops.object.light_add(type='AREA', location=(-3, 3, 5))
-    fill = bpy.context.object
+    fill = add_light('AREA', (-3, 3, 5))
     fill.data.energy = 500
     fill.data.size = 5
     fill.rotation_euler = (math.radians(45), 0, math.radians(-30))
 
     # Back light (Point)
-    bpy.ops.object.light_add(type='POINT', location=(0, -5, 5))
-    back = bpy.context.object
+    back = add_light('POINT', (0, -5, 5))
     back.data.energy = 300
 
+    _lighting_rig.extend((sun, fill, back))
+
 """
 HELPER
 
-Renders current scene adn saves image
+Sets the EEVEE quality for the following renders. The output is only looked at by the VLM, so the
+render samples are low and the screen space reflections, bloom and motion blur are off by default.
+The resolution is set explicitly so nothing is inherited from the .blend
 """
-def render_image(output_path):
+def configure_eevee(samples, ssr=False, bloom=False, resolution=RENDER_RESOLUTION, resolution_percentage=100):
     scene = bpy.context.scene
     scene.render.engine = 'BLENDER_EEVEE'
-    scene.render.image_settings.file_format = 'PNG'
+    eevee = scene.eevee
+    eevee.taa_render_samples = samples
+    # not every Blender version has all of these
+    if hasattr(eevee, "use_ssr"):
+        eevee.use_ssr = ssr
+    if hasattr(eevee, "use_bloom"):
+        eevee.use_bloom = bloom
+    if hasattr(eevee, "use_motion_blur"):
+        eevee.use_motion_blur = False
+    scene.render.use_motion_blur = False
+    scene.render.resolution_x, scene.render.resolution_y = resolution
+    scene.render.resolution_percentage = resolution_percentage
+
+"""
+HELPER
+
+Renders current scene adn saves image
+"""
+def render_image(output_path, file_format='PNG'):
+    scene = bpy.context.scene
+    set_output_format(scene, file_format)
     scene.render.filepath = output_path
     bpy.ops.render.render(write_still=True)
 
 """
 HELPER
 
+Renders frames 1..len(output_paths) of the current scene as one animation and moves frame i to output_paths[i - 1].
+The depsgraph and GPU uploads are set up once for all frames instead of once per still
+"""
+def render_frames(output_paths, file_format='PNG'):
+    scene = bpy.context.scene
+    set_output_format(scene, file_format)
+    frame_start, frame_end = scene.frame_start, scene.frame_end
+    scene.frame_start = 1
+    scene.frame_end = len(output_paths)
+
+    # Blender writes <prefix>0001.<ext>, <prefix>0002.<ext>, ...
+    prefix = os.path.join(os.path.dirname(output_paths[0]), "frame_")
+    scene.render.filepath = prefix + "####"
+    bpy.ops.render.render(animation=True)
+    for frame, output_path in enumerate(output_paths, start=1):
+        os.replace(scene.render.frame_path(frame=frame), output_path)
+
+    scene.frame_start, scene.frame_end = frame_start, frame_end
+
+"""
+HELPER
+
+Engine and image format for the next render
+"""
+def set_output_format(scene, file_format):
+    scene.render.engine = 'BLENDER_EEVEE'
+    image_settings = scene.render.image_settings
+    image_settings.file_format = file_format
+    # 8-bit RGB, the VLM has no use for 16-bit channels or alpha
+    image_settings.color_mode = 'RGB'
+    image_settings.color_depth = '8'
+    if file_format == 'JPEG':
+        image_settings.quality = JPEG_QUALITY
+    else:
+        image_settings.compression = PNG_COMPRESSION
+
+"""
+HELPER
+
+Keys of the objects in scene.json. With ijson only the keys are pulled out of the token stream, the
+objects themselves are never built (Blender's Python might not have it, then the file is loaded whole)
+"""
+def load_object_keys(scene_json_path):
+    if ijson is not None:
+        with open(scene_json_path, 'rb') as f:
+            return [value for prefix, event, value in ijson.parse(f) if prefix == "objects" and event == "map_key"]
+
+    with open(scene_json_path, 'r') as f:
+        scene_data = json.load(f)
+    return list(scene_data.get("objects", {}))
+
+"""
+HELPER
+
 Parser
 """
 def parse_blender_args():
@@ -184,6 +379,11 @@ def parse_blender_args():
     parser.add_argument("--scene_json", required=True)
     parser.add_argument("--output_dir", required=True)
     parser.add_argument("--blend_file", required=False)
+    # run_blender.py splits the assets over several Blender processes, each renders every num_shards-th asset
+    parser.add_argument("--shard_index", type=int, default=0)
+    parser.add_argument("--num_shards", type=int, default=1)
+    # assets / scene renders only that part, so the two can run as separate Blender processes
+    parser.add_argument("--mode", choices=["all", "assets", "scene"], default="all")
     return parser.parse_args(argv)
 
 """
@@ -192,18 +392,26 @@ HELPER
 Gets bounding box of object (input)
 """
 def get_object_bounds(obj):
-    bbox_corners = [obj.matrix_world @ mathutils.Vector(corner) for corner in obj.bound_box]
-    min_corner = mathutils.Vector((
-        min(v.x for v in bbox_corners),
-        min(v.y for v in bbox_corners),
-        min(v.z for v in bbox_corners)
-    ))
-    max_corner = mathutils.Vector((
-        max(v.x for v in bbox_corners),
-        max(v.y for v in bbox_corners),
-        max(v.z for v in bbox_corners)
-    ))
-    return min_corner, max_corner
+    return get_objects_bounds([obj])
+
+"""
+HELPER
+
+Gets the bounding box of all objects (input) together
+
+All 8 local bbox corners of every object are transformed by their matrix_world in one batched
+matmul and reduced with a single min/max, instead of Vector math per corner and object
+"""
+def get_objects_bounds(objs):
+    n = len(objs)
+    corners = np.ones((n, 8, 4))
+    matrices = np.empty((n, 4, 4))
+    for i, obj in enumerate(objs):
+        corners[i, :, :3] = obj.bound_box
+        matrices[i] = obj.matrix_world
+    # world[n, k] = matrix_world[n] @ corner[n, k]
+    world = np.einsum('nij,nkj->nki', matrices, corners)[..., :3].reshape(-1, 3)
+    return mathutils.Vector(world.min(axis=0)), mathutils.Vector(world.max(axis=0))
 
 """
 HELPER
@@ -225,37 +433,47 @@ Center asset in scene
 """
 def center_objects(objects):
     """Used for single-asset product renders—moves each object to the origin individually."""
-    bpy.ops.object.select_all(action='DESELECT')
-    for obj in objects:
-        obj.select_set(True)
     if objects:
-        bpy.context.view_layer.objects.active = objects[0]
-        bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
+        # origin_set only sees these objects through the override, the scene's selection is left alone
+        with bpy.context.temp_override(
+            selected_objects=objects,
+            selected_editable_objects=objects,
+            active_object=objects[0],
+            object=objects[0]
+        ):
+            bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='BOUNDS')
         for obj in objects:
-            obj.location = mathutils.Vector((0, 0, 0))
+            obj.location = (0, 0, 0)
 
 
 # ---------------------------------------------------------------------
 #                               MAIN
 # ---------------------------------------------------------------------
 
-def main():
-    args = parse_blender_args()
-
+"""
+Individual asset renders, 4 views of each glb into asset_images/
+"""
+def render_assets(args):
     scene_json_path = args.scene_json
     output_dir = args.output_dir
-    blend_file_path = args.blend_file
 
-    with open(scene_json_path, 'r') as f:
-        scene_data = json.load(f)
+    object_keys = load_object_keys(scene_json_path)
+    configure_eevee(ASSET_RENDER_SAMPLES, resolution_percentage=ASSET_RESOLUTION_PERCENTAGE)
+
+    # Individual Asset Renders, only this process's share of them
+    shard_keys = object_keys[args.shard_index::args.num_shards]
 
-    objects_dict = scene_data.get("objects", {})
+    # the parent is created once, each asset only needs its own directory
+    asset_images_dir = os.path.join(output_dir, "asset_images")
+    os.makedirs(asset_images_dir, exist_ok=True)
 
-    # Individual Asset Renders
-    for obj_key, obj_info in objects_dict.items():
+    for obj_key in shard_keys:
         sanitized_key = sanitize_filename(obj_key)
-        object_dir = os.path.join(output_dir, "asset_images", sanitized_key)
-        os.makedirs(object_dir, exist_ok=True)
+        object_dir = os.path.join(asset_images_dir, sanitized_key)
+        try:
+            os.mkdir(object_dir)
+        except FileExistsError:
+            pass
 
         object_id = obj_key.split('-', 1)[1]
 
@@ -280,30 +498,40 @@ def main():
         distance = calculate_camera_distance(main_obj, fov_deg=50, zoom_factor=2.0)
 
         # Increasingly zoom out because sometimes we don't get the whole asset, vice versa
-        product_perspectives = {
-            "angled_view_1": {"direction": (1, -1, 1), "zoom_increment": 1.0},
-            "angled_view_2": {"direction": (-1, -1, 1), "zoom_increment": 1.2},
-            "angled_view_3": {"direction": (-1,  1, 1), "zoom_increment": 1.4},
-            "angled_view_4": {"direction": ( 1,  1, 1), "zoom_increment": 1.6},
-        }
-
-        for view_name, params in product_perspectives.items():
-            direction = mathutils.Vector(params["direction"]).normalized()
-            cam_dist = distance * params["zoom_increment"]
+        # One camera keyframed on a frame per view, all views come out of a single animation render
+        camera = None
+        out_paths = []
+        for frame, (view_name, direction, zoom_increment) in enumerate(PRODUCT_VIEWS, start=1):
+            cam_dist = distance * zoom_increment
             cam_location = obj_center + direction * cam_dist
 
-            camera = setup_camera(cam_location, obj_center, fov_deg=50)
-            out_path = os.path.join(object_dir, f"{view_name}.png")
-            render_image(out_path)
+            if camera is None:
+                camera = setup_camera(cam_location, obj_center, fov_deg=50)
+            else:
+                point_camera(camera, cam_location, obj_center)
+            camera.keyframe_insert("location", frame=frame)
+            camera.keyframe_insert("rotation_euler", frame=frame)
+            out_paths.append(os.path.join(object_dir, f"{view_name}.jpg"))
+
+        render_frames(out_paths, file_format='JPEG')
+
+        bpy.data.objects.remove(camera, do_unlink=True)
+
+    print(f"\nDone with shard {args.shard_index}/{args.num_shards}")
 
-            bpy.data.objects.remove(camera, do_unlink=True)
+"""
+Whole scene renders from the .blend file into scene_image/
+"""
+def render_scene(args):
+    output_dir = args.output_dir
+    blend_file_path = args.blend_file
 
     # Handle whole scene render
     print("\nEntire Scene rendering")
     scene_img_dir = os.path.join(output_dir, "scene_image")
     os.makedirs(scene_img_dir, exist_ok=True)
 
-    clear_scene()
+    clear_scene(full=True)
     all_mesh_objects = []
 
 
@@ -317,21 +545,10 @@ def main():
         return
 
     setup_lighting()
+    configure_eevee(SCENE_RENDER_SAMPLES)
 
     # Get bbox for camera distance
-    def collective_bounds(objs):
-        min_c, max_c = get_object_bounds(objs[0])
-        for o in objs[1:]:
-            mi, ma = get_object_bounds(o)
-            min_c.x = min(min_c.x, mi.x)
-            min_c.y = min(min_c.y, mi.y)
-            min_c.z = min(min_c.z, mi.z)
-            max_c.x = max(max_c.x, ma.x)
-            max_c.y = max(max_c.y, ma.y)
-            max_c.z = max(max_c.z, ma.z)
-        return min_c, max_c
-
-    min_corner, max_corner = collective_bounds(all_mesh_objects)
+    min_corner, max_corner = get_objects_bounds(all_mesh_objects)
     scene_center = (min_corner + max_corner) / 2
     scene_size = max(
         max_corner.x - min_corner.x,
@@ -342,62 +559,38 @@ def main():
     base_distance = (scene_size / 2) / math.tan(math.radians(30 / 2))
     base_distance *= 1.2 
 
-    # Angled from the top perspectives like we did with the indv. assets
-    angled_perspectives = {
-        "scene_view_1": {"direction": (1, -1, 1), "zoom_increment": 0.8},
-        "scene_view_2": {"direction": (-1, -1, 1), "zoom_increment": 0.9},
-        "scene_view_3": {"direction": (-1, 1, 1),  "zoom_increment": 1.0},
-        "scene_view_4": {"direction": (1, 1, 1),   "zoom_increment": 1.1},
-    }
-
-    for view_name, params in angled_perspectives.items():
-        direction = mathutils.Vector(params["direction"]).normalized()
-        cam_dist = base_distance * params["zoom_increment"]
+    # All 9 cameras are set up before the first render and only scene.camera switches between renders,
+    # so the appended scene isn't re-evaluated for every camera added and removed
+    # Angled from the top perspectives like we did with the indv. assets,
+    # then 4 images of the cardinal directions (and the top-down one)
+    scene_cameras = []
+    for view_name, direction, zoom_increment in SCENE_ANGLED_VIEWS + SCENE_EXTRA_VIEWS:
+        cam_dist = base_distance * zoom_increment
         cam_location = scene_center + direction * cam_dist
 
         camera = setup_camera(cam_location, scene_center, fov_deg=30)
-        out_path = os.path.join(scene_img_dir, f"{view_name}.png")
-        render_image(out_path)
-
-        bpy.data.objects.remove(camera, do_unlink=True)
+        scene_cameras.append((view_name, camera))
 
-    # Now we also have 4 images of the cardinal directions
-    extra_perspectives = {
-        "birdseye_top": {
-            "direction": (0, 0, 1),
-            "zoom_increment": 1.0
-        },
-        "north_view": {
-            "direction": (0, 1, 0),
-            "zoom_increment": 1.0
-        },
-        "south_view": {
-            "direction": (0, -1, 0),
-            "zoom_increment": 1.0
-        },
-        "east_view": {
-            "direction": (1, 0, 0),
-            "zoom_increment": 1.0
-        },
-        "west_view": {
-            "direction": (-1, 0, 0),
-            "zoom_increment": 1.0
-        }
-    }
-
-    for view_name, params in extra_perspectives.items():
+    scene = bpy.context.scene
+    for view_name, camera in scene_cameras:
         print(f"Rendering {view_name} of entire scene")
-        direction = mathutils.Vector(params["direction"]).normalized()
-        cam_dist = base_distance * params["zoom_increment"]
-        cam_location = scene_center + direction * cam_dist
-
-        camera = setup_camera(cam_location, scene_center, fov_deg=30)
+        scene.camera = camera
         out_path = os.path.join(scene_img_dir, f"{view_name}.png")
         render_image(out_path)
 
+    for _, camera in scene_cameras:
         bpy.data.objects.remove(camera, do_unlink=True)
 
     print("\nDone with images", scene_img_dir)
 
+def main():
+    args = parse_blender_args()
+
+    if args.mode in ("all", "assets"):
+        render_assets(args)
+    # The whole scene is only rendered once, by the first shard
+    if args.mode == "scene" or (args.mode == "all" and args.shard_index == 0):
+        render_scene(args)
+
 if __name__ == "__main__":
     main()
@@ -27,32 +27,41 @@ import json
 import os
 import sys
 
+import numpy as np
+
+# ijson streams the objects instead of holding all of scene.json in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 def get_total_floor_dimensions(scene_json_path, blend_name):
 
+    # Stream the objects out of scene.json if we can, otherwise load it whole
+    if ijson is not None:
+        with open(scene_json_path, 'rb') as f:
+            return sum_floor_dimensions(ijson.kvitems(f, 'objects', use_float=True), blend_name)
+
     with open(scene_json_path, 'r') as f:
         scene_data = json.load(f)
 
-    objects_dict = scene_data.get("objects", {})
-
-    total_X = 0.0
-    total_Y = 0.0
+    return sum_floor_dimensions(scene_data.get("objects", {}).items(), blend_name)
 
+"""
+Sums the floor dimensions over (key, object) pairs, which are read once
+"""
+def sum_floor_dimensions(obj_items, blend_name):
     prefix = f"{blend_name}-"
 
-    for obj_key, obj_details in objects_dict.items():
-        # Remove the blend file name prefix from the object key
-        if obj_key.startswith(prefix):
-            obj_key_stripped = obj_key[len(prefix):]
-        else:
-            obj_key_stripped = obj_key
-
-        # Check if the object is a floor
-        if 'room' in obj_key_stripped.lower():
-            dimensions = obj_details.get("dimensions", [0.0, 0.0, 0.0])
-            if len(dimensions) >= 2:
-                x = float(dimensions[0])
-                y = float(dimensions[1])
-                total_X += x
-                total_Y += y
-
-    return {"total_X": total_X, "total_Y": total_Y}
+    # (x, y) of every floor, i.e. every object with "room" in its key once the blend file name prefix is removed
+    floor_dims = [
+        (dimensions[0], dimensions[1])
+        for obj_key, obj_details in obj_items
+        if 'room' in (obj_key[len(prefix):] if obj_key.startswith(prefix) else obj_key).lower()
+        for dimensions in (obj_details.get("dimensions", [0.0, 0.0, 0.0]),)
+        if len(dimensions) >= 2
+    ]
+    # Sum of the widths and lengths in one reduction
+    totals = np.asarray(floor_dims, dtype=np.float64).reshape(-1, 2).sum(axis=0)
+
+    return {"total_X": float(totals[0]), "total_Y": float(totals[1])}
@@ -9,19 +9,59 @@ INPUTS
  - blender_executable: executable.
  - blender_script: Blender Python script.
  - args: List of arguments to pass to the Blender script.
+ - num_workers: number of Blender processes to run side by side. Each one gets
+   --shard_index/--num_shards appended to its args and renders only its share of the assets
+ - gpus: optional list of GPU ids, worker i only sees gpus[i % len(gpus)] through CUDA_VISIBLE_DEVICES.
+   Without it the workers are pinned to disjoint sets of CPU cores where the OS supports it (EEVEE/CPU renders)
+ - log_dir, log_name: Blender's output of shard i is written to log_dir/<log_name>_shard<i>.log
 
 OUTPUTS
  - script dependent, but see get_image.py
+ - the per-shard Blender logs
 """
 
 import subprocess
 import os
 import sys
 
-def run_blender_script(blender_executable, blender_script, args):
+# Blender is heavy on memory, so only a few instances run at once by default
+DEFAULT_NUM_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+"""
+HELPER
+
+Starts the Blender process for shard idx of num_workers and returns its Popen. Its stdout and stderr
+go straight into log_file instead of being buffered here. The CPU pinning is applied from this process
+once the child exists (a preexec_fn would run between fork and exec, which isn't safe with threads around)
+"""
+def start_shard(command, clean_env, idx, num_workers, gpus, log_file):
+    env = dict(clean_env)
+    shard_cpus = None
+    if gpus:
+        env["CUDA_VISIBLE_DEVICES"] = str(gpus[idx % len(gpus)])
+    elif num_workers > 1 and hasattr(os, "sched_setaffinity"):
+        # disjoint slice of the cores, so the shards don't fight over the same ones
+        cpus = sorted(os.sched_getaffinity(0))
+        shard_cpus = cpus[idx::num_workers] or cpus
+
+    shard_command = command + ["--shard_index", str(idx), "--num_shards", str(num_workers)]
+    proc = subprocess.Popen(shard_command, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+    if shard_cpus is not None:
+        try:
+            os.sched_setaffinity(proc.pid, shard_cpus)
+        except OSError:
+            # it already exited, its return code tells the rest
+            pass
+    return proc
+
+def run_blender_script(blender_executable, blender_script, args, num_workers=1, gpus=None, log_dir=".", log_name="blender"):
     # Prep command
+    # --factory-startup skips the user preferences and add-ons and -noaudio the audio device setup,
+    # each shard pays Blender's startup again
     command = [
         blender_executable,
+        "-noaudio",
+        "--factory-startup",
         "--background",
         "--python", blender_script,
         "--",
@@ -34,8 +74,21 @@ def run_blender_script(blender_executable, blender_script, args):
         if var in clean_env:
             del clean_env[var]
 
-    # Run command
-    result = subprocess.run(command, env=clean_env, capture_output=True, text=True)
+    # Run command, one Blender process per shard, all started before waiting on any of them
+    num_workers = max(1, num_workers)
+    os.makedirs(log_dir, exist_ok=True)
+    log_paths = [os.path.join(log_dir, f"{log_name}_shard{idx}.log") for idx in range(num_workers)]
+    results = []
+    for idx in range(num_workers):
+        with open(log_paths[idx], 'w') as log_file:
+            results.append(start_shard(command, clean_env, idx, num_workers, gpus, log_file))
+    for proc in results:
+        proc.wait()
+
+    for idx, result in enumerate(results):
+        if result.returncode != 0:
+            print(f"Blender shard {idx}/{num_workers} exited with {result.returncode}, see {log_paths[idx]}", file=sys.stderr)
+    return results
 
 
 if __name__ == "__main__":
@@ -44,7 +97,17 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--blender_executable", required=True)
     parser.add_argument("--blender_script", required=True)
+    parser.add_argument("--num_workers", type=int, default=DEFAULT_NUM_WORKERS)
+    parser.add_argument("--gpus", type=str, default=None, help="Comma separated GPU ids to spread the workers over")
+    parser.add_argument("--log_dir", default=".", help="Directory for the per-shard Blender logs")
+    parser.add_argument("--log_name", default="blender")
     parser.add_argument("--args", nargs=argparse.REMAINDER)
     args = parser.parse_args()
 
-    run_blender_script(args.blender_executable, args.blender_script, args.args or [])
+    gpus = args.gpus.split(",") if args.gpus else None
+    results = run_blender_script(
+        args.blender_executable, args.blender_script, args.args or [], args.num_workers, gpus,
+        log_dir=args.log_dir, log_name=args.log_name
+    )
+    if any(result.returncode != 0 for result in results):
+        sys.exit(1)
@@ -31,28 +31,45 @@ def main():
         "--output_dir", args.output_dir
     ], check=True)
 
-    # 2) Render images with Blender
-    subprocess.run([
+    # 2) Render images with Blender, the asset renders and the whole scene render run side by side
+    render_cmd = [
         "python",
         "src/get_scene_info/run_blender.py",
         "--blender_executable", "/Applications/Blender.app/Contents/MacOS/blender",
         "--blender_script", "src/get_scene_info/get_image.py",
-        "--args",
+    ]
+    render_args = [
         "--scene_json", os.path.join(args.output_dir, "scene.json"),
         "--output_dir", args.output_dir,
         "--blend_file", args.input_blend
-    ], check=True)
-
-    # 3) Assign labels to objects in scene.json
-    subprocess.run([
+    ]
+    log_args = ["--log_dir", os.path.join(args.output_dir, "logs")]
+    render_procs = [
+        subprocess.Popen(render_cmd + log_args + ["--log_name", "blender_assets", "--args"] + render_args + ["--mode", "assets"]),
+        subprocess.Popen(render_cmd + log_args + ["--log_name", "blender_scene", "--num_workers", "1", "--args"] + render_args + ["--mode", "scene"]),
+    ]
+    # wait on both before failing, so no Blender keeps rendering after we stop
+    for proc in render_procs:
+        proc.wait()
+    for proc in render_procs:
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+    # 3) Assign labels to objects in scene.json, in the background since it mostly waits on the model.
+    # The floor dimensions (4) and the prompts (5) don't use the labels, so they overlap with it;
+    # the wall extraction (7) and everything after it does, so we wait for it before step 6.
+    # Its output goes to a log file so it doesn't interleave with the prompts
+    os.makedirs(os.path.join(args.output_dir, "logs"), exist_ok=True)
+    labels_log = open(os.path.join(args.output_dir, "logs", "get_asset_labels.log"), "w")
+    labels_proc = subprocess.Popen([
         "python",
         "src/get_scene_info/get_asset_labels.py",
         "--input_dir", args.output_dir,
         "--blend_name", blend_name,
         "--scene_json", os.path.join(args.output_dir, "scene.json")
-    ], check=True)
+    ], stdout=labels_log, stderr=subprocess.STDOUT)
 
-    # 4) Find current floor dimensions
+    # 4) Find current floor dimensions (get_asset_labels replaces scene.json atomically, so this reads either version)
     from get_scene_info.get_total_floor_dimensions import get_total_floor_dimensions
     scene_json_path = os.path.join(args.output_dir, "scene.json")
     floor_dims = get_total_floor_dimensions(scene_json_path, blend_name)
@@ -69,18 +86,24 @@ def main():
     prompt = input("Prompt: ")
     print("\n\n\n\n")
 
+    print("Waiting for the asset labels...")
+    labels_proc.wait()
+    labels_log.close()
+    if labels_proc.returncode != 0:
+        raise subprocess.CalledProcessError(labels_proc.returncode, labels_proc.args)
+
+
+    # The create_scene stages run in-process on shared dicts, so scene.json is parsed once
+    # and new_scene.json is only written when a subprocess needs to read it
+    from create_scene.add_resized_floor import scale_floor
+    from create_scene.add_resized_walls import scale_walls, load_json, save_json
+    from create_scene.place_individual_assets import place_individual
+    from create_scene.place_cloneable_assets import place_cloneables
+    scene_data = load_json(scene_json_path)
 
     # 6) Add the scaled floor to new_scene.json
     new_scene_json_path = os.path.join(args.output_dir, "new_scene.json")
-    subprocess.run([
-        "python",
-        "src/create_scene/add_resized_floor.py",
-        "--scene_json", scene_json_path,
-        "--blend_name", blend_name,
-        "--new_X", str(new_X),
-        "--new_Y", str(new_Y),
-        "--new_scene_json", new_scene_json_path
-    ], check=True)
+    new_scene_data = scale_floor(scene_data, blend_name, new_X, new_Y)
 
     # 7) Extract wall_list.json from scene.json
     subprocess.run([
@@ -91,14 +114,14 @@ def main():
     ], check=True)
 
     # 8) Scale the walls and add them to new_scene.json
-    subprocess.run([
-        "python",
-        "src/create_scene/add_resized_walls.py",
-        "--original_scene", scene_json_path,
-        "--wall_list", os.path.join(args.output_dir, "wall_list.json"),
-        "--new_scene", new_scene_json_path,
-        "--scale_factor", str(new_X / total_X),
-    ], check=True)
+    new_scene_data = scale_walls(
+        orig_data=scene_data,
+        groups=load_json(os.path.join(args.output_dir, "wall_list.json")),
+        new_scene_data=new_scene_data,
+        scale_factor=new_X / total_X
+    )
+    # extract_groups reads the floors + walls from disk
+    save_json(new_scene_data, new_scene_json_path, indent=False)
 
     # 9) Group objects (not walls or floors) into asset_group_list.json
     subprocess.run([
@@ -112,27 +135,25 @@ def main():
         "--prompt", "We are making the living room bigger. Mark groups as cloneable if we might need multiples."
     ], check=True)
 
+    asset_groups = load_json(os.path.join(args.output_dir, "asset_group_list.json"))
+
     # 10) Place individual objects
-    subprocess.run([
-    "python",
-    "src/create_scene/place_individual_assets.py",
-    "--original_scene", os.path.join(args.output_dir, "scene.json"),
-    "--asset_group_list", os.path.join(args.output_dir, "asset_group_list.json"),
-    "--new_scene", os.path.join(args.output_dir, "new_scene.json"),
-    "--scale_factor", str(new_X / total_X)
-    ], check=True)
+    new_scene_data = place_individual(
+        original_data=scene_data,
+        asset_groups=asset_groups,
+        new_scene_data=new_scene_data,
+        scale_factor=new_X / total_X
+    )
 
     # 11) Place cloned objects
-    subprocess.run([
-        "python",
-        "src/create_scene/place_cloneable_assets.py",
-        "--original_scene", os.path.join(args.output_dir, "scene.json"),
-        "--asset_group_list", os.path.join(args.output_dir, "asset_group_list.json"),
-        "--new_scene", os.path.join(args.output_dir, "new_scene.json"),
-        "--scale_factor_x", str(new_X / total_X),
-        "--scale_factor_y", str(new_X / total_X),
-
-    ], check=True)
+    new_scene_data = place_cloneables(
+        original_data=scene_data,
+        asset_groups=asset_groups,
+        new_scene_data=new_scene_data,
+        scale_factor_x=new_X / total_X,
+        scale_factor_y=new_X / total_X
+    )
+    save_json(new_scene_data, new_scene_json_path, indent=False)
 
 
 